@@ -0,0 +1,209 @@
+# benchmarks for graph.py
+#
+# usage: python bench.py [--sizes 1000 10000 100000] [--topologies random hub]
+#                        [--degree 4] [--queries 20] [--budget B] [-o out.json]
+#
+# for every topology and size a network is written with gen_network.py
+# (same seed, same file) and the suite times loading (text parsing,
+# building the WeightedGraph, the CSRGraph with and without its snapshot),
+# shortestPath in each mode and shortestPathByStops on random city pairs,
+# the three MST engines and counting allAffordableTrips from a sample of
+# start cities. every step is also run once under tracemalloc for its peak
+# memory (skip that with --no-memory, it is slow). with --counters the
+# search counters of graph.instrumentation are added per network (totals
+# per algorithm over every run, the tracemalloc ones included). results
+# are JSON, so two versions can be compared run against run
+#
+# route printing goes to os.devnull, it is part of what shortestPath costs
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import gen_network
+import graph
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+def percentiles(samples, points=(50, 90, 99)):
+    ordered = sorted(samples)
+    result = {}
+    for point in points:
+        # nearest rank percentile
+        rank = max(1, -(-point * len(ordered) // 100))
+        result[f"p{point}"] = ordered[rank - 1]
+    result["min"] = ordered[0]
+    result["max"] = ordered[-1]
+    result["mean"] = sum(ordered) / len(ordered)
+    return result
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+# peak bytes allocated by Python while running function(*args)
+def peak_memory(function, *args):
+    tracemalloc.start()
+    try:
+        function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+# {"seconds": ..., "peak_bytes": ...} for one call, and the call's result
+def measure(memory, function, *args):
+    result, seconds = timed(function, *args)
+    entry = {"seconds": seconds}
+    if memory:
+        entry["peak_bytes"] = peak_memory(function, *args)
+    return result, entry
+
+def quietly(function, *args):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return function(*args)
+
+def _load_cold(path):
+    snapshot = graph.snapshot_path(path)
+    if os.path.exists(snapshot):
+        os.remove(snapshot)
+    return graph.load_csr_graph(path)
+
+def bench_loading(path, memory):
+    data, parse = measure(memory, graph.load_airline, path, False)
+    network, build = measure(memory, graph.graph_from_data, data)
+    _, cold = measure(memory, _load_cold, path)
+    csr, warm = measure(memory, graph.load_csr_graph, path)
+    results = {"parse": parse, "build_graph": build, "csr_write_snapshot": cold, "csr_from_snapshot": warm}
+    return results, data, network, csr
+
+# seconds per query for every mode, on the WeightedGraph and the CSRGraph
+def bench_routes(graphs, pairs, memory):
+    modes = [
+        ("distance", graph.shortestPath, "based on the distance"),
+        ("price", graph.shortestPath, "based on the price"),
+        ("stops", graph.shortestPathByStops, None),
+    ]
+    results = {}
+    for kind, network in graphs.items():
+        results[kind] = {}
+        for mode, function, cost_type in modes:
+            def run(start, end):
+                if cost_type is None:
+                    return quietly(function, network, start, end)
+                return quietly(function, network, cost_type, start, end)
+
+            samples = [timed(run, start, end)[1] for start, end in pairs]
+            entry = {"seconds": percentiles(samples), "queries": len(pairs)}
+            if memory:
+                entry["peak_bytes"] = peak_memory(run, *pairs[0])
+            results[kind][mode] = entry
+    return results
+
+def bench_mst(network, memory):
+    results = {}
+    for algorithm in graph.MST_ALGORITHMS:
+        mst, entry = measure(memory, graph.minimum_spanning_tree, network, "distance", algorithm)
+        entry["edges"] = len(mst)
+        results[algorithm] = entry
+    return results
+
+# a budget a few legs deep: three times the cheapest price
+def default_budget(data):
+    return 3 * min(data.prices)
+
+def bench_trips(network, budget, starts, memory):
+    count, entry = measure(memory, graph.count_affordable_trips, network, budget, starts)
+    entry.update({"budget": budget, "start_cities": len(starts), "trips": count})
+    return entry
+
+def bench_network(path, queries=20, budget=None, trip_starts=100, seed=2025, memory=True, counters=False):
+    if counters:
+        graph.instrumentation.reset()
+        graph.instrumentation.enable()
+    try:
+        result = _bench_network(path, queries, budget, trip_starts, seed, memory)
+    finally:
+        graph.instrumentation.disable()
+    if counters:
+        result["counters"] = graph.instrumentation.totals()
+    return result
+
+def _bench_network(path, queries, budget, trip_starts, seed, memory):
+    rng = random.Random(seed)
+    loading, data, network, csr = bench_loading(path, memory)
+    names = data.names
+    pairs = [(rng.choice(names), rng.choice(names)) for _ in range(queries)]
+    starts = rng.sample(names, min(trip_starts, len(names)))
+    if budget is None:
+        budget = default_budget(data)
+    return {
+        "cities": len(names),
+        "connections": len(data.sources),
+        "file_bytes": os.path.getsize(path),
+        "load": loading,
+        "routes": bench_routes({"graph": network, "csr": csr}, pairs, memory),
+        "mst": bench_mst(network, memory),
+        "trips": bench_trips(network, budget, starts, memory),
+    }
+
+def run_suite(sizes, topologies, degree=4, queries=20, budget=None, trip_starts=100, seed=2025,
+              memory=True, counters=False, directory=None):
+    networks = []
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        for topology in topologies:
+            for size in sizes:
+                path = os.path.join(tmp, f"{topology}_{size}.txt")
+                _, generated = timed(gen_network.generate, path, topology, size, degree * size, None, 2, seed)
+                result = {"topology": topology, "seed": seed, "generate_seconds": generated}
+                result.update(bench_network(path, queries, budget, trip_starts, seed, memory, counters))
+                networks.append(result)
+                for name in (path, graph.snapshot_path(path)):
+                    if os.path.exists(name):
+                        os.remove(name)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "networks": networks,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="graph.py benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="numbers of cities")
+    parser.add_argument("--topologies", nargs="+", default=["random", "hub"], choices=["random", "hub"])
+    parser.add_argument("--degree", type=int, default=4, help="random: connections per city")
+    parser.add_argument("--queries", type=int, default=20, help="city pairs per route mode")
+    parser.add_argument("--budget", type=float, help="trip budget, default 3x the cheapest price")
+    parser.add_argument("--trip-starts", type=int, default=100, help="start cities for the trips count")
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc runs")
+    parser.add_argument("--counters", action="store_true", help="add search counters to the results")
+    parser.add_argument("--tmpdir", help="where to write the network files")
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.sizes, args.topologies, args.degree, args.queries, args.budget,
+                        args.trip_starts, args.seed, not args.no_memory, args.counters, args.tmpdir)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# synthetic airline files for graph.py
+#
+# usage: python gen_network.py random out.txt --cities 100000 --edges 400000 [--seed 2025]
+#        python gen_network.py hub out.txt --cities 100000 --hubs 50 [--spokes 2] [--seed 2025]
+#
+# files use the airline format graph.py reads: the city count, one name
+# per line, then "city1 city2 miles price" per connection (1-based city
+# numbers). cities get random coordinates on a 3000 x 3000 mile map, a
+# connection's distance is the straight line between its cities and its
+# price grows with the distance, so cheap routes are also mostly short.
+#
+# "random" first joins every city to an earlier one (so the network is
+# connected) and then adds random connections up to --edges. "hub" is
+# hub-and-spoke: the hubs are all connected to each other and every other
+# city flies to --spokes of them plus, now and then, a regional hop to
+# another city. the same seed always writes the same file, and
+# connections are written as they are generated, so millions of them
+# need no memory.
+
+import argparse
+import math
+import random
+import sys
+
+MAP_SIZE = 3000
+WRITE_BATCH = 1 << 14
+
+def city_names(count):
+    width = len(str(count))
+    return [f"City{i:0{width}d}" for i in range(1, count + 1)]
+
+def coordinates(count, rng):
+    return [(rng.uniform(0, MAP_SIZE), rng.uniform(0, MAP_SIZE)) for _ in range(count)]
+
+# (miles, price) of a connection between two points
+def leg(points, city1, city2, rng):
+    (x1, y1), (x2, y2) = points[city1], points[city2]
+    miles = int(math.hypot(x1 - x2, y1 - y2)) + 1
+    price = 40 + miles * rng.uniform(0.08, 0.16)
+    return miles, round(price, 2)
+
+# connections (city1, city2) of a connected random network, 0-based
+def random_connections(cities, edges, rng):
+    for city in range(1, cities):
+        yield rng.randrange(city), city
+    for _ in range(max(0, edges - (cities - 1))):
+        city1 = rng.randrange(cities)
+        city2 = rng.randrange(cities - 1)
+        if city2 >= city1:
+            city2 += 1
+        yield city1, city2
+
+# connections of a hub-and-spoke network, hubs are cities 0 .. hubs - 1
+def hub_connections(cities, hubs, spokes, rng, regional=0.1):
+    hubs = max(1, min(hubs, cities))
+    for hub1 in range(hubs):
+        for hub2 in range(hub1 + 1, hubs):
+            yield hub1, hub2
+    for city in range(hubs, cities):
+        first = rng.randrange(hubs)
+        for offset in range(min(spokes, hubs)):
+            yield (first + offset) % hubs, city
+        if city > hubs and rng.random() < regional:
+            yield rng.randrange(hubs, city), city
+
+def write_network(path, names, points, connections, rng):
+    with open(path, "w") as file:
+        file.write(f"{len(names)}\n")
+        file.write("\n".join(names) + "\n")
+        lines = []
+        count = 0
+        for city1, city2 in connections:
+            miles, price = leg(points, city1, city2, rng)
+            lines.append(f"{city1 + 1} {city2 + 1} {miles} {price:.2f}\n")
+            if len(lines) >= WRITE_BATCH:
+                file.writelines(lines)
+                count += len(lines)
+                lines = []
+        file.writelines(lines)
+        count += len(lines)
+    return count
+
+# write a network file, returns the number of connections written
+def generate(path, topology, cities, edges=None, hubs=None, spokes=2, seed=2025):
+    if cities < 2:
+        raise ValueError("a network needs at least 2 cities")
+    rng = random.Random(seed)
+    names = city_names(cities)
+    points = coordinates(cities, rng)
+    if topology == "random":
+        connections = random_connections(cities, edges if edges is not None else 4 * cities, rng)
+    elif topology == "hub":
+        if hubs is None:
+            hubs = max(2, int(math.sqrt(cities) / 4))
+        connections = hub_connections(cities, hubs, spokes, rng)
+    else:
+        raise ValueError(f"unknown topology {topology!r}, choose random or hub")
+    return write_network(path, names, points, connections, rng)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="write a synthetic airline file")
+    parser.add_argument("topology", choices=["random", "hub"])
+    parser.add_argument("output")
+    parser.add_argument("--cities", type=int, default=1000)
+    parser.add_argument("--edges", type=int, help="random: connections, default 4 per city")
+    parser.add_argument("--hubs", type=int, help="hub: number of hubs, default sqrt(cities) / 4")
+    parser.add_argument("--spokes", type=int, default=2, help="hub: hubs each city flies to")
+    parser.add_argument("--seed", type=int, default=2025)
+    args = parser.parse_args(argv)
+
+    count = generate(args.output, args.topology, args.cities, args.edges, args.hubs, args.spokes, args.seed)
+    print(f"{args.output}: {args.cities} cities, {count} connections")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,18 +4,27 @@
 # Dr Duan
 
 import heapq
-from collections import deque
-
-# used for displayDirectRoutes()
-global_connections = []
+import json
+import logging
+import os
+import struct
+import sys
+import time
+from array import array
+from collections import OrderedDict, deque, namedtuple
+from collections.abc import Mapping
+from contextlib import contextmanager
 
 class WeightedGraph:
     def __init__(self):
         self.adjacency_list = {}
+        # bumped on every change, so caches (RouteCache) know when to drop results
+        self.version = 0
 
     def add_vertex(self, vertex):
         if vertex not in self.adjacency_list:
             self.adjacency_list[vertex] = []
+            self.version += 1
 
     def add_edge(self, vertex1, vertex2, weight):
         if vertex1 not in self.adjacency_list:
@@ -26,8 +35,10 @@ class WeightedGraph:
 
         # undirected
         self.adjacency_list[vertex2].append((vertex1, weight))
+        self.version += 1
 
     def remove_edge(self, vertex1, vertex2):
+        self.version += 1
         if vertex1 in self.adjacency_list:
             self.adjacency_list[vertex1] = [
                 (v, w) for v, w in self.adjacency_list[vertex1] if v != vertex2
@@ -42,247 +53,1797 @@ class WeightedGraph:
             for adjacent in list(self.adjacency_list[vertex]):
                 self.remove_edge(vertex, adjacent[0])
             del self.adjacency_list[vertex]
+            self.version += 1
 
     def display(self):
         for vertex, edges in self.adjacency_list.items():
             print(f"{vertex}: {edges}")
 
-def A_Project2(airlineDataFileName):
-    print(airlineDataFileName, "...")
-    graph = WeightedGraph()
+    # frozen, array backed copy of this graph (see CSRGraph)
+    def freeze(self):
+        return CSRGraph.from_graph(self)
+
+# typed array for a weight column: 64-bit ints when every weight is an
+# int (so they still print as "127 miles"), doubles otherwise
+def weight_array(values):
+    if isinstance(values, array) and values.typecode in ('q', 'd'):
+        return values
+    values = list(values)
+    if all(type(value) is int for value in values):
+        return array('q', values)
+    return array('d', values)
+
+# read-only compressed sparse row form of a WeightedGraph
+#
+# cities are numbered 0..V-1 (names[id], ids[name]) and the neighbors of
+# city u are targets[offsets[u]:offsets[u+1]], with the matching leg
+# weights in distances and prices. neighbors keep the order they were
+# added in, and repeated identical legs are stored only once (both by
+# freeze() and by from_edges, so a file gives the same arrays either way).
+#
+# adjacency_list is a read-only view with the same shape as
+# WeightedGraph.adjacency_list, so every function in this file that takes
+# a graph also works on a CSRGraph
+class CSRGraph:
+    def __init__(self, names, offsets, targets, distances, prices):
+        self.names = list(names)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.offsets = offsets
+        self.targets = targets
+        self.distances = distances
+        self.prices = prices
+        self.adjacency_list = CSRAdjacency(self)
+        # never changes, kept so RouteCache treats both graph types alike
+        self.version = 0
+
+    @classmethod
+    def from_graph(cls, graph):
+        names = list(graph.adjacency_list)
+        ids = {name: i for i, name in enumerate(names)}
+        offsets = array('q', [0])
+        targets = array('q')
+        distances = []
+        prices = []
+        for name in names:
+            seen = set()
+            for neighbor, (distance, price) in graph.adjacency_list[name]:
+                leg = (neighbor, distance, price)
+                if leg in seen:
+                    continue
+                seen.add(leg)
+                targets.append(ids[neighbor])
+                distances.append(distance)
+                prices.append(price)
+            offsets.append(len(targets))
+        return cls(names, offsets, targets, weight_array(distances), weight_array(prices))
+
+    # build straight from undirected edge columns (city ids into names),
+    # without going through a WeightedGraph
+    @classmethod
+    def from_edges(cls, names, sources, destinations, distances, prices):
+        count = len(names)
+        distance_column = weight_array(distances)
+        price_column = weight_array(prices)
+
+        # drop repeated identical connections (in either direction) like
+        # from_graph does, the first one keeps its place
+        seen = set()
+        edges = []
+        for edge in zip(sources, destinations, distance_column, price_column):
+            u, v, distance, price = edge
+            key = (u, v, distance, price) if u <= v else (v, u, distance, price)
+            if key not in seen:
+                seen.add(key)
+                edges.append(edge)
 
-    if airlineDataFileName.strip().lower() == "airline1.txt":
-        global global_connections
-        with open(airlineDataFileName, 'r') as file:
-            lines = file.readlines()
+        degree = [0] * (count + 1)
+        for u, v, _, _ in edges:
+            degree[u + 1] += 1
+            # a loop is a single leg, WeightedGraph stores it twice and
+            # from_graph keeps one
+            if u != v:
+                degree[v + 1] += 1
+        for i in range(count):
+            degree[i + 1] += degree[i]
+        offsets = array('q', degree)
 
-        city_count = int(lines[0].strip())
-        city_names = {}
+        # counting sort by source city, stable so insertion order is kept
+        size = offsets[-1]
+        position = list(degree[:count])
+        targets = array('q', bytes(size * array('q').itemsize))
+        out_distances = array(distance_column.typecode, bytes(size * distance_column.itemsize))
+        out_prices = array(price_column.typecode, bytes(size * price_column.itemsize))
+        for u, v, distance, price in edges:
+            for a, b in ((u, v), (v, u)) if u != v else ((u, v),):
+                slot = position[a]
+                targets[slot] = b
+                out_distances[slot] = distance
+                out_prices[slot] = price
+                position[a] += 1
+        return cls(names, offsets, targets, out_distances, out_prices)
+
+    def vertex_count(self):
+        return len(self.names)
+
+    # number of stored (directed) legs, twice the number of distinct
+    # connections less one per loop
+    def leg_count(self):
+        return len(self.targets)
+
+    def neighbors(self, vertex_id):
+        return range(self.offsets[vertex_id], self.offsets[vertex_id + 1])
+
+    def _read_only(self, *args):
+        raise TypeError("CSRGraph is read-only, edit the WeightedGraph and freeze() again")
+
+    add_vertex = add_edge = remove_edge = remove_vertex = _read_only
+
+    def display(self):
+        for vertex, edges in self.adjacency_list.items():
+            print(f"{vertex}: {edges}")
 
-        for i in range(city_count):
-            city_name = lines[1 + i].strip()
-            graph.add_vertex(city_name)
-            city_names[i + 1] = city_name
+# city name -> [(neighbor, (distance, price)), ...] view over a CSRGraph,
+# the lists are built when asked for and not stored
+class CSRAdjacency(Mapping):
+    def __init__(self, graph):
+        self.graph = graph
 
-        for line in lines[1 + city_count:]:
-            parts = line.strip().split()
+    def __getitem__(self, vertex):
+        graph = self.graph
+        u = graph.ids[vertex]
+        names = graph.names
+        targets = graph.targets
+        distances = graph.distances
+        prices = graph.prices
+        return [(names[targets[i]], (distances[i], prices[i])) for i in graph.neighbors(u)]
+
+    def __iter__(self):
+        return iter(self.graph.names)
+
+    def __len__(self):
+        return len(self.graph.names)
+
+    def __contains__(self, vertex):
+        return vertex in self.graph.ids
+
+# ---------- loading airline files ----------
+
+# airline file contents as columns: city names, then per connection the
+# 0-based city ids, distance and price, in file order
+AirlineData = namedtuple("AirlineData", ["names", "sources", "destinations", "distances", "prices"])
+
+# parse an airline file line by line:
+#   city count, one city name per line, then "city1 city2 distance price"
+#   per connection (cities numbered from 1); other lines are skipped
+def parse_airline_file(filename):
+    sources = array('q')
+    destinations = array('q')
+    distances = array('q')
+    prices = array('d')
+
+    with open(filename, 'r') as file:
+        city_count = int(file.readline().strip())
+        names = [file.readline().strip() for _ in range(city_count)]
+
+        for line_number, line in enumerate(file, start=city_count + 2):
+            parts = line.split()
             if len(parts) != 4:
                 continue
-            city1 = city_names[int(parts[0])]
-            city2 = city_names[int(parts[1])]
-            distance = int(parts[2])
-            cost = float(parts[3])
-            graph.add_edge(city1, city2, (distance, cost))
-            global_connections.append((city1, city2, distance, cost))
-        return graph
-
-    # fallback dummy graph
-    graph.add_vertex("A")
-    graph.add_vertex("B")
-    graph.add_vertex("C")
-    graph.add_vertex("D")
-    graph.add_edge("A", "B", (4, 1))
-    graph.add_edge("A", "C", (3, 1))
-    graph.add_edge("B", "C", (2, 1))
-    graph.add_edge("C", "D", (7, 1))
-    return graph
+            city1 = int(parts[0]) - 1
+            city2 = int(parts[1]) - 1
+            if not (0 <= city1 < city_count and 0 <= city2 < city_count):
+                raise ValueError(f"{filename}:{line_number}: no city numbered {parts[0]} or {parts[1]}")
+            sources.append(city1)
+            destinations.append(city2)
+            distances.append(int(parts[2]))
+            prices.append(float(parts[3]))
 
-def load_graph_from_file(filename):
+    return AirlineData(names, sources, destinations, distances, prices)
+
+# binary snapshot next to the text file (<file>.snap):
+#   magic, byte order, source size and mtime_ns, city count, connection
+#   count, length of the names block, the names joined by newlines, the
+#   four connection columns as raw arrays, then the CSRGraph arrays
+#   (offsets, targets, distances, prices) so load_csr_graph needs no work;
+#   the leg count is the last offset, repeated connections are stored once.
+#   every column uses a fixed width type ('q' or 'd', 8 bytes everywhere),
+#   since the width of 'l' differs between platforms
+SNAPSHOT_MAGIC = b"AIRSNAP4"
+SNAPSHOT_HEADER = struct.Struct("<8s8sqqqqq")
+EDGE_TYPECODES = ('q', 'q', 'q', 'd')
+CSR_TYPECODES = ('q', 'q', 'q', 'd')
+
+def snapshot_path(filename):
+    return filename + ".snap"
+
+def write_snapshot(filename, data, csr=None, path=None):
+    if csr is None:
+        csr = CSRGraph.from_edges(*data)
+    stat = os.stat(filename)
+    names_block = "\n".join(data.names).encode("utf-8")
+    path = path or snapshot_path(filename)
+    with open(path + ".tmp", "wb") as file:
+        file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, sys.byteorder.encode().ljust(8), stat.st_size,
+                                        stat.st_mtime_ns, len(data.names), len(data.sources), len(names_block)))
+        file.write(names_block)
+        for column, typecode in zip(data[1:], EDGE_TYPECODES):
+            array(typecode, column).tofile(file)
+        csr_columns = (csr.offsets, csr.targets, csr.distances, csr.prices)
+        for column, typecode in zip(csr_columns, CSR_TYPECODES):
+            array(typecode, column).tofile(file)
+    os.replace(path + ".tmp", path)
+
+# (AirlineData, CSRGraph) from the snapshot, or None when it is missing,
+# from another machine's byte order or older than the text file
+def read_snapshot(filename, path=None):
+    path = path or snapshot_path(filename)
+    try:
+        stat = os.stat(filename)
+        with open(path, "rb") as file:
+            header = file.read(SNAPSHOT_HEADER.size)
+            if len(header) != SNAPSHOT_HEADER.size:
+                return None
+            magic, byteorder, size, mtime_ns, city_count, edge_count, names_size = SNAPSHOT_HEADER.unpack(header)
+            if magic != SNAPSHOT_MAGIC or byteorder.strip() != sys.byteorder.encode():
+                return None
+            if size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+                return None
+            names = file.read(names_size).decode("utf-8").split("\n") if city_count else []
+
+            columns = []
+            for typecode in EDGE_TYPECODES:
+                column = array(typecode)
+                column.fromfile(file, edge_count)
+                columns.append(column)
+            offsets = array(CSR_TYPECODES[0])
+            offsets.fromfile(file, city_count + 1)
+            csr_columns = [offsets]
+            for typecode in CSR_TYPECODES[1:]:
+                column = array(typecode)
+                column.fromfile(file, offsets[-1])
+                csr_columns.append(column)
+    except (OSError, EOFError, ValueError, struct.error):
+        return None
+    data = AirlineData(names, *columns)
+    return data, CSRGraph(names, *csr_columns)
+
+# airline file columns and frozen graph, from the snapshot when it is up
+# to date, otherwise parsed from the text (and the snapshot rewritten
+# when snapshot is True)
+def _load(filename, snapshot):
+    if snapshot:
+        loaded = read_snapshot(filename)
+        if loaded is not None:
+            return loaded
+    data = parse_airline_file(filename)
+    csr = CSRGraph.from_edges(*data)
+    if snapshot:
+        try:
+            write_snapshot(filename, data, csr)
+        except OSError:
+            # a read-only directory just means no snapshot
+            pass
+    return data, csr
+
+def load_airline(filename, snapshot=True):
+    return _load(filename, snapshot)[0]
+
+def graph_from_data(data):
     graph = WeightedGraph()
+    names = data.names
+    for name in names:
+        graph.add_vertex(name)
+    for city1, city2, distance, cost in zip(*data[1:]):
+        graph.add_edge(names[city1], names[city2], (distance, cost))
+    return graph
+
+# connections in their original direction, (city1, city2, distance, cost)
+def connections_from_data(data):
+    names = data.names
+    return [(names[city1], names[city2], distance, cost) for city1, city2, distance, cost in zip(*data[1:])]
+
+# frozen graph straight from the columns, skipping the WeightedGraph
+# dictionaries, for large networks
+def load_csr_graph(filename, snapshot=True):
+    return _load(filename, snapshot)[1]
 
+def A_Project2(airlineDataFileName):
+    print(airlineDataFileName, "...")
+    return graph_from_data(load_airline(airlineDataFileName))
+
+def load_graph_from_file(filename):
+    data = load_airline(filename)
     # store connections in original direction
-    connections = []
+    return graph_from_data(data), connections_from_data(data)
 
-    with open(filename, 'r') as file:
-        lines = file.readlines()
+def displayDirectRoutes(graph):
+    write_report(direct_routes_report(graph))
+
+# ---------- minimum spanning tree ----------
+#
+# trees are returned as lists of (city1, city2, distance, cost) with
+# city1 < city2, over either weight ("distance" or "price"); on a
+# disconnected network they span every piece (a forest)
+
+def _mst_index(cost_type):
+    kind = parse_cost_type(cost_type)
+    if kind not in ("distance", "price"):
+        raise ValueError(f"MST needs a distance or price cost type, not {cost_type!r}")
+    return 0 if kind == "distance" else 1
+
+# every connection once, the cheapest leg when a pair has several, in the
+# order first seen; ties between equal weights are broken by this order
+def unique_edges(graph, index):
+    best = {}
+    for src, edges in graph.adjacency_list.items():
+        for dst, (distance, cost) in edges:
+            if src == dst:
+                continue
+            pair = (src, dst) if src < dst else (dst, src)
+            weight = (distance, cost)[index]
+            if pair not in best or weight < (best[pair][2], best[pair][3])[index]:
+                best[pair] = (pair[0], pair[1], distance, cost)
+    return list(best.values())
+
+class DisjointSet:
+    def __init__(self, items=()):
+        self.parent = {item: item for item in items}
+        self.rank = dict.fromkeys(self.parent, 0)
+
+    def add(self, item):
+        if item not in self.parent:
+            self.parent[item] = item
+            self.rank[item] = 0
 
-    city_count = int(lines[0].strip())
-    city_names = {}
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
 
-    for i in range(city_count):
-        city_name = lines[1 + i].strip()
-        graph.add_vertex(city_name)
-        city_names[i + 1] = city_name
+    def union(self, x, y):
+        xroot = self.find(x)
+        yroot = self.find(y)
+        if xroot == yroot:
+            return False
+        if self.rank[xroot] < self.rank[yroot]:
+            xroot, yroot = yroot, xroot
+        self.parent[yroot] = xroot
+        if self.rank[xroot] == self.rank[yroot]:
+            self.rank[xroot] += 1
+        return True
 
-    for line in lines[1 + city_count:]:
-        parts = line.strip().split()
-        if len(parts) != 4:
+# Kruskal: sort every edge, keep the ones joining two pieces
+def kruskal_mst(graph, cost_type="distance"):
+    index = _mst_index(cost_type)
+    edges = unique_edges(graph, index)
+    order = sorted(range(len(edges)), key=lambda i: (edges[i][2 + index], i))
+    pieces = DisjointSet(graph.adjacency_list)
+    return [edges[i] for i in order if pieces.union(edges[i][0], edges[i][1])]
+
+# Prim with a binary heap: grow one tree at a time from the cheapest leg
+# leaving it, good for dense networks
+def prim_mst(graph, cost_type="distance"):
+    index = _mst_index(cost_type)
+    adjacency = graph.adjacency_list
+    in_tree = set()
+    mst = []
+    counter = 0
+
+    for root in adjacency:
+        if root in in_tree:
             continue
-        city1_index = int(parts[0])
-        city2_index = int(parts[1])
-        distance = int(parts[2])
-        cost = float(parts[3])
+        in_tree.add(root)
+        pq = []
+        for neighbor, weight in adjacency[root]:
+            counter += 1
+            heapq.heappush(pq, (weight[index], counter, root, neighbor, weight))
 
-        city1 = city_names[city1_index]
-        city2 = city_names[city2_index]
+        while pq:
+            _, _, src, dst, (distance, cost) = heapq.heappop(pq)
+            if dst in in_tree:
+                continue
+            in_tree.add(dst)
+            mst.append((src, dst, distance, cost) if src < dst else (dst, src, distance, cost))
+            for neighbor, weight in adjacency[dst]:
+                if neighbor not in in_tree:
+                    counter += 1
+                    heapq.heappush(pq, (weight[index], counter, dst, neighbor, weight))
+    return mst
 
-        graph.add_edge(city1, city2, (distance, cost))
+# Boruvka: every piece picks its cheapest outgoing edge each round, so
+# the number of pieces at least halves per pass over the edge list; good
+# for large sparse networks
+def boruvka_mst(graph, cost_type="distance"):
+    index = _mst_index(cost_type)
+    edges = unique_edges(graph, index)
+    pieces = DisjointSet(graph.adjacency_list)
+    mst = []
 
-        # only one direction
-        connections.append((city1, city2, distance, cost))
+    while True:
+        cheapest = {}
+        for i, edge in enumerate(edges):
+            a = pieces.find(edge[0])
+            b = pieces.find(edge[1])
+            if a == b:
+                continue
+            # (weight, position) is a strict order, so no cycle can form
+            key = (edge[2 + index], i)
+            if a not in cheapest or key < cheapest[a]:
+                cheapest[a] = key
+            if b not in cheapest or key < cheapest[b]:
+                cheapest[b] = key
+        if not cheapest:
+            return mst
+        for _, i in sorted(set(cheapest.values())):
+            if pieces.union(edges[i][0], edges[i][1]):
+                mst.append(edges[i])
 
-    return graph, connections
+MST_ALGORITHMS = {
+    "kruskal": kruskal_mst,
+    "prim": prim_mst,
+    "boruvka": boruvka_mst,
+}
 
-def displayDirectRoutes(graph):
-    connections = global_connections
-    city_count = len(graph.adjacency_list)
-    unique_connections = set(tuple(sorted((src, dst))) for src, dst, *_ in connections)
-    total_connections = len(unique_connections)
-    print(f"There are {city_count} cities and {total_connections} direct connections.\n")
-    seen = set()  # used only for total count
-    for city in graph.adjacency_list:
-        print(f"({city}):")
-        printed = False
-        for src, dst, distance, cost in connections:
-            if city == src:
-                print(f"   {src}-{dst}, {distance} miles, ${cost:.2f}")
-                printed = True
-                seen.add(tuple(sorted((src, dst))))
-            elif city == dst:
-                print(f"   {dst}-{src}, {distance} miles, ${cost:.2f}")
-                printed = True
-                seen.add(tuple(sorted((src, dst))))
-        if not printed:
-            print("   (no direct routes)")
-        print()
+def minimum_spanning_tree(graph, cost_type="distance", algorithm="kruskal"):
+    if algorithm not in MST_ALGORITHMS:
+        raise ValueError(f"unknown MST algorithm {algorithm!r}, choose from {sorted(MST_ALGORITHMS)}")
+    return MST_ALGORITHMS[algorithm](graph, cost_type)
+
+# minimum spanning forest kept up to date while connections change
+#
+# edits go through add_edge / remove_edge / remove_vertex here, which
+# update the WeightedGraph as well. adding a connection only looks at the
+# tree path between its cities (swapping out the heaviest leg on it if the
+# new one is lighter); removing a tree connection reconnects the two
+# halves with the cheapest crossing connection. edits made to the graph
+# directly are noticed through graph.version and trigger a rebuild.
+class DynamicMST:
+    def __init__(self, graph, cost_type="distance"):
+        self.graph = graph
+        self.index = _mst_index(cost_type)
+        self.rebuild()
+
+    def rebuild(self):
+        # pair -> (city1, city2, distance, cost) for the cheapest leg of every connection
+        self.edges = {(e[0], e[1]): e for e in unique_edges(self.graph, self.index)}
+        # city -> {neighbor: edge} for tree edges only
+        self.tree = {city: {} for city in self.graph.adjacency_list}
+        for edge in kruskal_mst(self.graph, ("distance", "price")[self.index]):
+            self._link(edge)
+        self.version = self.graph.version
+
+    def _weight(self, edge):
+        return edge[2 + self.index]
+
+    def _link(self, edge):
+        self.tree[edge[0]][edge[1]] = edge
+        self.tree[edge[1]][edge[0]] = edge
+
+    def _unlink(self, edge):
+        del self.tree[edge[0]][edge[1]]
+        del self.tree[edge[1]][edge[0]]
+
+    def _sync(self):
+        if self.graph.version != self.version:
+            self.rebuild()
+
+    # tree edges on the path between two cities, None if they are apart
+    def _tree_path(self, start, end):
+        parent = {start: None}
+        stack = [start]
+        while stack:
+            city = stack.pop()
+            if city == end:
+                path = []
+                while parent[city] is not None:
+                    previous = parent[city]
+                    path.append(self.tree[previous][city])
+                    city = previous
+                return path
+            for neighbor in self.tree[city]:
+                if neighbor not in parent:
+                    parent[neighbor] = city
+                    stack.append(neighbor)
+        return None
+
+    def add_edge(self, vertex1, vertex2, weight):
+        self._sync()
+        self.graph.add_edge(vertex1, vertex2, weight)
+        self.version = self.graph.version
+        for city in (vertex1, vertex2):
+            self.tree.setdefault(city, {})
+        if vertex1 == vertex2:
+            return
+
+        pair = (vertex1, vertex2) if vertex1 < vertex2 else (vertex2, vertex1)
+        edge = (pair[0], pair[1], weight[0], weight[1])
+        old = self.edges.get(pair)
+        if old is not None and self._weight(old) <= self._weight(edge):
+            # a cheaper leg already connects them
+            return
+        self.edges[pair] = edge
+        if old is not None and pair[1] in self.tree[pair[0]]:
+            # cheaper leg for a tree connection
+            self._unlink(old)
+            self._link(edge)
+            return
+
+        path = self._tree_path(vertex1, vertex2)
+        if path is None:
+            self._link(edge)
+            return
+        heaviest = max(path, key=self._weight)
+        if self._weight(heaviest) > self._weight(edge):
+            self._unlink(heaviest)
+            self._link(edge)
+
+    def remove_edge(self, vertex1, vertex2):
+        self._sync()
+        self.graph.remove_edge(vertex1, vertex2)
+        self.version = self.graph.version
+        pair = (vertex1, vertex2) if vertex1 < vertex2 else (vertex2, vertex1)
+        edge = self.edges.pop(pair, None)
+        if edge is None or pair[1] not in self.tree.get(pair[0], {}):
+            return
+        self._unlink(edge)
+
+        # cities still joined to vertex1, then the cheapest way back across
+        side = {vertex1}
+        stack = [vertex1]
+        while stack:
+            for neighbor in self.tree[stack.pop()]:
+                if neighbor not in side:
+                    side.add(neighbor)
+                    stack.append(neighbor)
+        crossing = [e for e in self.edges.values() if (e[0] in side) != (e[1] in side)]
+        if crossing:
+            self._link(min(crossing, key=self._weight))
+
+    def remove_vertex(self, vertex):
+        self._sync()
+        if vertex not in self.tree:
+            return
+        for neighbor in [n for n, _ in self.graph.adjacency_list.get(vertex, [])]:
+            self.remove_edge(vertex, neighbor)
+        self.graph.remove_vertex(vertex)
+        self.version = self.graph.version
+        self.tree.pop(vertex, None)
+
+    def mst_edges(self):
+        self._sync()
+        return [edge for city, links in self.tree.items() for neighbor, edge in links.items() if city < neighbor]
+
+    def total_weight(self):
+        return sum(self._weight(edge) for edge in self.mst_edges())
 
 # display the MST
 def displayMSTServiceRoute(graph):
-    print("*** MINIMUM SPANNING TREE ***")
-    print("(The edges in the MST based on distance):")
-    edges = set()
-    for src in graph.adjacency_list:
-        for dst, (distance, cost) in graph.adjacency_list[src]:
-            edge = tuple(sorted((src, dst)))
-            edges.add((edge[0], edge[1], distance, cost))
-    sorted_edges = sorted(edges, key=lambda x: x[2])
-
-    parent = {}
-    rank = {}
-
-    def find(x):
-        if parent[x] != x:
-            parent[x] = find(parent[x])
-        return parent[x]
-
-    def union(x, y):
-        xroot = find(x)
-        yroot = find(y)
-        if xroot == yroot:
-            return False
-        if rank[xroot] < rank[yroot]:
-            parent[xroot] = yroot
+    write_report(mst_report(graph))
+
+# ---------- instrumentation ----------
+#
+# off by default. the searches keep their counters in locals (most are
+# derived after the search: pushes = pops + entries left on the heap,
+# pops = settled + stale) and only check instrumentation.enabled once,
+# at the end, so leaving this disabled costs a few local increments per
+# search. when enabled every search sends one event to each sink:
+#
+#   {"algorithm": "dijkstra", "seconds": ..., "source": ..., <counters>}
+#
+# source and target are city names, or ids on a CSRGraph (pushes include
+# the start entry every heap begins with). events sent
+# inside "with instrumentation.query(name, **fields)" also carry
+# "query": name and those fields, and totals() sums the counters per
+# algorithm since the last reset().
+
+# event fields that describe a search rather than count its work
+_LABEL_FIELDS = ("source", "target", "budget")
+
+class Instrumentation:
+    def __init__(self):
+        self.enabled = False
+        self.sinks = []
+        self.context = {}
+        self.totals_by_algorithm = {}
+
+    # start recording; sinks are callables taking the event dict
+    def enable(self, *sinks):
+        self.sinks.extend(sinks)
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self.sinks = []
+
+    def reset(self):
+        self.totals_by_algorithm = {}
+
+    @contextmanager
+    def query(self, name, **fields):
+        previous = self.context
+        self.context = {**previous, "query": name, **fields}
+        try:
+            yield self
+        finally:
+            self.context = previous
+
+    def record(self, algorithm, started, **counters):
+        seconds = time.perf_counter() - started
+        totals = self.totals_by_algorithm.setdefault(algorithm, {"calls": 0, "seconds": 0.0})
+        totals["calls"] += 1
+        totals["seconds"] += seconds
+        for name, value in counters.items():
+            # flags such as found are bools, they stay out of the sums
+            if name not in _LABEL_FIELDS and type(value) in (int, float):
+                totals[name] = totals.get(name, 0) + value
+
+        event = {"algorithm": algorithm, "seconds": seconds, **self.context, **counters}
+        for sink in self.sinks:
+            sink(event)
+
+    def totals(self):
+        return {algorithm: dict(values) for algorithm, values in self.totals_by_algorithm.items()}
+
+instrumentation = Instrumentation()
+
+# sink writing one JSON object per line to an open file
+def json_sink(file):
+    def write(event):
+        file.write(json.dumps(event, default=str) + "\n")
+    return write
+
+# sink logging each event (as JSON) through the logging module
+def log_sink(logger=None, level=logging.DEBUG):
+    logger = logger or logging.getLogger("graph")
+
+    def log(event):
+        if logger.isEnabledFor(level):
+            logger.log(level, "%s", json.dumps(event, default=str))
+    return log
+
+# ---------- route queries ----------
+
+# cost_type strings are matched the way shortestPath always has: anything
+# containing "distance", "price" or "stop" ("based on the price", ...)
+def parse_cost_type(cost_type):
+    cost_type = cost_type.lower()
+    if "distance" in cost_type:
+        return "distance"
+    if "price" in cost_type:
+        return "price"
+    if "stop" in cost_type:
+        return "stops"
+    return None
+
+# one itinerary: legs are (from, to, distance, price), cost is the value
+# that was minimised (miles, dollars or number of legs)
+class Route(namedtuple("Route", ["start", "end", "cost_type", "cost", "distance", "price", "legs"])):
+    __slots__ = ()
+
+    @property
+    def stops(self):
+        return len(self.legs)
+
+    @property
+    def cities(self):
+        return [self.start] + [leg[1] for leg in self.legs]
+
+def make_route(start, end, cost_type, cost, legs):
+    distance = sum(leg[2] for leg in legs)
+    price = sum(leg[3] for leg in legs)
+    return Route(start, end, cost_type, cost, distance, price, legs)
+
+# legs from key back to the root of a parent map, last leg first
+def parent_legs(graph, parent, key):
+    csr = isinstance(graph, CSRGraph)
+    legs = []
+    while parent[key] is not None:
+        previous, leg = parent[key]
+        if csr:
+            legs.append((graph.names[previous], graph.names[key], graph.distances[leg], graph.prices[leg]))
         else:
-            parent[yroot] = xroot
-            if rank[xroot] == rank[yroot]:
-                rank[xroot] += 1
-        return True
+            legs.append((previous, key, leg[0], leg[1]))
+        key = previous
+    return legs
 
-    for city in graph.adjacency_list:
-        parent[city] = city
-        rank[city] = 0
+# shortest path tree from one start city
+#
+# cost maps each reached city to its best known cost and parent maps it to
+# the city it was reached from and the leg used, so a route is read off by
+# walking parents back to the start instead of copying paths during the
+# search. on a CSRGraph the keys are city ids and the leg is the slot in
+# the CSR arrays. only cities in settled have final costs.
+class PathTree:
+    def __init__(self, graph, cost_type, start, cost, parent, settled):
+        self.graph = graph
+        self.cost_type = cost_type
+        self.start = start
+        self.cost = cost
+        self.parent = parent
+        self.settled = settled
 
-    mst = []
-    for src, dst, distance, cost in sorted_edges:
-        if union(src, dst):
-            mst.append((src, dst, distance, cost))
+    def _key(self, city):
+        if isinstance(self.graph, CSRGraph):
+            return self.graph.ids.get(city)
+        return city
+
+    def reached(self, city):
+        return self._key(city) in self.settled
+
+    def route(self, end):
+        key = self._key(end)
+        if key not in self.settled:
+            return None
+
+        legs = parent_legs(self.graph, self.parent, key)
+        legs.reverse()
+        return make_route(self.start, end, self.cost_type, self.cost[self._key(end)], legs)
+
+    # routes to every settled city
+    def routes(self):
+        graph = self.graph
+        if isinstance(graph, CSRGraph):
+            return {graph.names[key]: self.route(graph.names[key]) for key in self.settled}
+        return {city: self.route(city) for city in self.settled}
+
+# dijkstra (distance, price) or breadth first search (stops) from start
+#
+# with targets the search stops as soon as every target is settled,
+# without it the whole reachable network is covered
+def shortest_path_tree(graph, cost_type, start, targets=None):
+    kind = parse_cost_type(cost_type)
+    if kind is None:
+        raise ValueError(f"invalid cost type {cost_type!r}")
+
+    if isinstance(graph, CSRGraph):
+        source = graph.ids.get(start)
+        goals = None if targets is None else {graph.ids[t] for t in targets if t in graph.ids}
+        search = _bfs_csr if kind == "stops" else _dijkstra_csr
+    else:
+        source = start if start in graph.adjacency_list else None
+        goals = None if targets is None else set(targets)
+        search = _bfs if kind == "stops" else _dijkstra
+
+    if source is None:
+        return PathTree(graph, kind, start, {}, {}, set())
+    cost, parent, settled = search(graph, kind, source, goals)
+    return PathTree(graph, kind, start, cost, parent, settled)
+
+def _record_heap_search(algorithm, started, source, settled, stale, left, **counters):
+    pops = settled + stale
+    instrumentation.record(algorithm, started, source=source, settled=settled, pops=pops,
+                           pushes=pops + left, stale=stale, **counters)
+
+def _record_bfs(started, source, cost, queue):
+    instrumentation.record("bfs", started, source=source, reached=len(cost),
+                           expanded=len(cost) - len(queue), depth=max(cost.values()))
+
+def _dijkstra(graph, kind, start, targets):
+    started = time.perf_counter()
+    adjacency = graph.adjacency_list
+    index = 0 if kind == "distance" else 1
+    cost = {start: 0}
+    parent = {start: None}
+    settled = set()
+    remaining = len(targets) if targets is not None else -1
+    pq = [(0, start)]
+    stale = 0
+
+    while pq:
+        total_cost, current = heapq.heappop(pq)
+        if current in settled:
+            stale += 1
+            continue
+        settled.add(current)
+        if targets is not None and current in targets:
+            remaining -= 1
+            if remaining == 0:
+                break
+
+        for neighbor, weight in adjacency[current]:
+            if neighbor in settled:
+                continue
+            new_cost = total_cost + weight[index]
+            if neighbor not in cost or new_cost < cost[neighbor]:
+                cost[neighbor] = new_cost
+                parent[neighbor] = (current, weight)
+                heapq.heappush(pq, (new_cost, neighbor))
+
+    if instrumentation.enabled:
+        _record_heap_search("dijkstra", started, start, len(settled), stale, len(pq))
+    return cost, parent, settled
+
+def _dijkstra_csr(graph, kind, start, targets):
+    started = time.perf_counter()
+    offsets = graph.offsets
+    targets_column = graph.targets
+    weights = graph.distances if kind == "distance" else graph.prices
+    cost = {start: 0}
+    parent = {start: None}
+    settled = set()
+    remaining = len(targets) if targets is not None else -1
+    pq = [(0, start)]
+    stale = 0
+
+    while pq:
+        total_cost, current = heapq.heappop(pq)
+        if current in settled:
+            stale += 1
+            continue
+        settled.add(current)
+        if targets is not None and current in targets:
+            remaining -= 1
+            if remaining == 0:
+                break
+
+        for slot in range(offsets[current], offsets[current + 1]):
+            neighbor = targets_column[slot]
+            if neighbor in settled:
+                continue
+            new_cost = total_cost + weights[slot]
+            if neighbor not in cost or new_cost < cost[neighbor]:
+                cost[neighbor] = new_cost
+                parent[neighbor] = (current, slot)
+                heapq.heappush(pq, (new_cost, neighbor))
 
-    for src, dst, distance, cost in mst:
-        print(f"{src}-{dst}, {distance} miles, ${cost:.2f}")
+    if instrumentation.enabled:
+        _record_heap_search("dijkstra", started, start, len(settled), stale, len(pq))
+    return cost, parent, settled
+
+# cities are marked when queued, so each one is queued once
+def _bfs(graph, kind, start, targets):
+    started = time.perf_counter()
+    adjacency = graph.adjacency_list
+    cost = {start: 0}
+    parent = {start: None}
+    remaining = len(targets) if targets is not None else -1
+    if targets is not None and start in targets:
+        remaining -= 1
+    queue = deque([start])
+
+    while queue and remaining != 0:
+        current = queue.popleft()
+        for neighbor, weight in adjacency[current]:
+            if neighbor in cost:
+                continue
+            cost[neighbor] = cost[current] + 1
+            parent[neighbor] = (current, weight)
+            queue.append(neighbor)
+            if targets is not None and neighbor in targets:
+                remaining -= 1
+                if remaining == 0:
+                    break
+
+    if instrumentation.enabled:
+        _record_bfs(started, start, cost, queue)
+    # bfs costs are final as soon as they are set
+    return cost, parent, cost.keys()
+
+def _bfs_csr(graph, kind, start, targets):
+    started = time.perf_counter()
+    offsets = graph.offsets
+    targets_column = graph.targets
+    cost = {start: 0}
+    parent = {start: None}
+    remaining = len(targets) if targets is not None else -1
+    if targets is not None and start in targets:
+        remaining -= 1
+    queue = deque([start])
+
+    while queue and remaining != 0:
+        current = queue.popleft()
+        for slot in range(offsets[current], offsets[current + 1]):
+            neighbor = targets_column[slot]
+            if neighbor in cost:
+                continue
+            cost[neighbor] = cost[current] + 1
+            parent[neighbor] = (current, slot)
+            queue.append(neighbor)
+            if targets is not None and neighbor in targets:
+                remaining -= 1
+                if remaining == 0:
+                    break
+
+    if instrumentation.enabled:
+        _record_bfs(started, start, cost, queue)
+    return cost, parent, cost.keys()
+
+# neighbors of a city (name, or id on a CSRGraph) as (neighbor, leg cost, leg),
+# where leg is what parent maps store for it
+def _expander(graph, kind):
+    if isinstance(graph, CSRGraph):
+        offsets = graph.offsets
+        targets = graph.targets
+        if kind == "stops":
+            return lambda u: [(targets[slot], 1, slot) for slot in range(offsets[u], offsets[u + 1])]
+        weights = graph.distances if kind == "distance" else graph.prices
+        return lambda u: [(targets[slot], weights[slot], slot) for slot in range(offsets[u], offsets[u + 1])]
+
+    adjacency = graph.adjacency_list
+    if kind == "stops":
+        return lambda u: [(v, 1, weight) for v, weight in adjacency[u]]
+    index = 0 if kind == "distance" else 1
+    return lambda u: [(v, weight[index], weight) for v, weight in adjacency[u]]
+
+# bidirectional dijkstra: a search from each end, always advancing the one
+# with the smaller frontier key, stopping once the two keys add up to the
+# best meeting cost found so far
+def _bidirectional_dijkstra(expand, source, target):
+    started = time.perf_counter()
+    cost = ({source: 0}, {target: 0})
+    parent = ({source: None}, {target: None})
+    settled = (set(), set())
+    pq = ([(0, source)], [(0, target)])
+    best = None
+    meet = None
+    stale = 0
+
+    while pq[0] and pq[1]:
+        if best is not None and pq[0][0][0] + pq[1][0][0] >= best:
+            break
+        side = 0 if pq[0][0][0] <= pq[1][0][0] else 1
+        total_cost, current = heapq.heappop(pq[side])
+        if current in settled[side]:
+            stale += 1
+            continue
+        settled[side].add(current)
+
+        mine = cost[side]
+        other = cost[1 - side]
+        for neighbor, leg_cost, leg in expand(current):
+            new_cost = total_cost + leg_cost
+            if neighbor not in mine or new_cost < mine[neighbor]:
+                mine[neighbor] = new_cost
+                parent[side][neighbor] = (current, leg)
+                heapq.heappush(pq[side], (new_cost, neighbor))
+            if neighbor in other:
+                through = mine[neighbor] + other[neighbor]
+                if best is None or through < best:
+                    best = through
+                    meet = neighbor
+
+    if instrumentation.enabled:
+        _record_heap_search("bidirectional_dijkstra", started, source, len(settled[0]) + len(settled[1]),
+                            stale, len(pq[0]) + len(pq[1]), target=target,
+                            settled_forward=len(settled[0]), settled_backward=len(settled[1]),
+                            found=meet is not None)
+    return best, meet, parent
+
+# bidirectional breadth first search, expanding the smaller frontier one
+# whole level at a time; cities are marked when queued
+def _bidirectional_bfs(expand, source, target):
+    started = time.perf_counter()
+    depth = ({source: 0}, {target: 0})
+    parent = ({source: None}, {target: None})
+    frontier = ([source], [target])
+    best = None
+    meet = None
+    levels = 0
+
+    while frontier[0] and frontier[1] and meet is None:
+        levels += 1
+        side = 0 if len(frontier[0]) <= len(frontier[1]) else 1
+        mine = depth[side]
+        other = depth[1 - side]
+        next_level = []
+        for current in frontier[side]:
+            for neighbor, _, leg in expand(current):
+                if neighbor not in mine:
+                    mine[neighbor] = mine[current] + 1
+                    parent[side][neighbor] = (current, leg)
+                    next_level.append(neighbor)
+                if neighbor in other:
+                    through = mine[neighbor] + other[neighbor]
+                    if best is None or through < best:
+                        best = through
+                        meet = neighbor
+        frontier = (next_level, frontier[1]) if side == 0 else (frontier[0], next_level)
+
+    if instrumentation.enabled:
+        instrumentation.record("bidirectional_bfs", started, source=source, target=target, levels=levels,
+                               reached_forward=len(depth[0]), reached_backward=len(depth[1]),
+                               found=meet is not None)
+    return best, meet, parent
+
+# best route from start to end, None when end can't be reached
+#
+# searches from both ends at once, so only the area around the two cities
+# is explored instead of everything closer to start than end is
+def find_route(graph, cost_type, start, end):
+    kind = parse_cost_type(cost_type)
+    if kind is None:
+        raise ValueError(f"invalid cost type {cost_type!r}")
+    return _find_route(graph, kind, start, end)[0]
+
+# (route, number of cities the two searches reached)
+def _find_route(graph, kind, start, end):
+    if isinstance(graph, CSRGraph):
+        source = graph.ids.get(start)
+        target = graph.ids.get(end)
+    else:
+        source = start if start in graph.adjacency_list else None
+        target = end if end in graph.adjacency_list else None
+    if source is None or target is None:
+        return None, 0
+    if source == target:
+        return make_route(start, end, kind, 0, []), 1
+
+    search = _bidirectional_bfs if kind == "stops" else _bidirectional_dijkstra
+    best, meet, parent = search(_expander(graph, kind), source, target)
+    reached = len(parent[0]) + len(parent[1])
+    if meet is None:
+        return None, reached
+
+    forward = parent_legs(graph, parent[0], meet)
+    forward.reverse()
+    # the backward search's parent legs already run towards end
+    backward = [(dst, src, distance, price) for src, dst, distance, price in parent_legs(graph, parent[1], meet)]
+    return make_route(start, end, kind, best, forward + backward), reached
+
+# best routes from start to each of ends (every reachable city when ends
+# is None), as {city: Route}; unreachable cities are left out
+def find_routes(graph, cost_type, start, ends=None):
+    tree = shortest_path_tree(graph, cost_type, start, ends)
+    if ends is None:
+        return tree.routes()
+    routes = {}
+    for end in ends:
+        route = tree.route(end)
+        if route is not None:
+            routes[end] = route
+    return routes
+
+# cache of shortest path trees for repeated route queries
+#
+# trees are kept per (cost type, start city) in an LRU of max_trees
+# entries; since legs go both ways a cached tree from the end city also
+# answers the reversed query. precompute_all_pairs pins a tree for every
+# city so nothing is searched again. any add_edge, remove_edge,
+# add_vertex or remove_vertex on the graph (seen through graph.version)
+# empties the cache before the next lookup.
+class RouteCache:
+    def __init__(self, graph, max_trees=256):
+        self.graph = graph
+        self.max_trees = max_trees
+        self.trees = OrderedDict()
+        # cost type -> {start: PathTree} from precompute_all_pairs
+        self.all_pairs = {}
+        self.version = graph.version
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def invalidate(self):
+        self.trees.clear()
+        self.all_pairs.clear()
+        self.version = self.graph.version
+        self.invalidations += 1
+
+    def _check_version(self):
+        if self.graph.version != self.version:
+            self.invalidate()
+
+    def _cached_tree(self, kind, start):
+        table = self.all_pairs.get(kind)
+        if table is not None:
+            return table.get(start)
+        tree = self.trees.get((kind, start))
+        if tree is not None:
+            self.trees.move_to_end((kind, start))
+        return tree
+
+    def tree(self, cost_type, start):
+        kind = parse_cost_type(cost_type)
+        if kind is None:
+            raise ValueError(f"invalid cost type {cost_type!r}")
+        self._check_version()
+
+        tree = self._cached_tree(kind, start)
+        if tree is not None:
+            self.hits += 1
+            return tree
+
+        self.misses += 1
+        tree = shortest_path_tree(self.graph, kind, start)
+        self.trees[(kind, start)] = tree
+        if len(self.trees) > self.max_trees:
+            self.trees.popitem(last=False)
+        return tree
+
+    def route(self, cost_type, start, end):
+        kind = parse_cost_type(cost_type)
+        if kind is None:
+            raise ValueError(f"invalid cost type {cost_type!r}")
+        self._check_version()
+
+        if self._cached_tree(kind, start) is None:
+            reverse = self._cached_tree(kind, end)
+            if reverse is not None:
+                self.hits += 1
+                return reverse_route(reverse.route(start))
+        return self.tree(kind, start).route(end)
+
+    # pin a full tree for every city, refused above max_vertices since it
+    # costs V searches and V trees of memory
+    def precompute_all_pairs(self, cost_types=("distance", "price", "stops"), max_vertices=5000):
+        cities = list(self.graph.adjacency_list)
+        if len(cities) > max_vertices:
+            raise ValueError(f"{len(cities)} cities is too many for an all-pairs table (max {max_vertices})")
+        self._check_version()
+        for cost_type in cost_types:
+            kind = parse_cost_type(cost_type)
+            self.all_pairs[kind] = {city: shortest_path_tree(self.graph, kind, city) for city in cities}
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "trees": len(self.trees),
+            "all_pairs": sorted(self.all_pairs),
+            "invalidations": self.invalidations,
+            "graph_version": self.version,
+        }
+
+# the same itinerary travelled the other way
+def reverse_route(route):
+    if route is None:
+        return None
+    legs = [(dst, src, distance, price) for src, dst, distance, price in reversed(route.legs)]
+    return Route(route.end, route.start, route.cost_type, route.cost, route.distance, route.price, legs)
+
+def print_route(route):
+    if route.cost_type == "stops":
+        print(f"Path with least stops from ({route.start}) to ({route.end}): {route.stops} stops.")
+        for src, dst, _, _ in route.legs:
+            print(f"{src}\n   ...{dst}")
+    elif route.cost_type == "price":
+        print(f"Cheapest path from ({route.start}) to ({route.end}): ${route.cost:.2f}.")
+        for src, dst, _, price in route.legs:
+            print(f"{src}\n   ...{dst} : {price:.2f}")
+    else:
+        print(f"Shortest distance from ({route.start}) to ({route.end}): {route.cost} miles.")
+        for src, dst, distance, _ in route.legs:
+            print(f"{src}\n   ...{dst} : {distance}")
     print()
 
 def shortestPath(graph, cost_type, start, end):
-    cost_type = cost_type.lower()
-    if "distance" in cost_type:
-        cost_index = 0
-        label = "miles"
-        title = f"Shortest distance from ({start}) to ({end}):"
-    elif "price" in cost_type:
-        cost_index = 1
-        label = "$"
-        title = f"Cheapest path from ({start}) to ({end}):"
-    elif "stop" in cost_type:
+    kind = parse_cost_type(cost_type)
+    if kind is None:
+        print("Invalid cost type.")
+        return None
+    if kind == "stops":
         return shortestPathByStops(graph, start, end)
+
+    route = find_route(graph, kind, start, end)
+    if route is None:
+        print(f"No path found from {start} to {end}.\n")
     else:
-        print("Invalid cost type.")
-        return
+        print_route(route)
+    return route
+
+def shortestPathByStops(graph, start, end):
+    route = find_route(graph, "stops", start, end)
+    if route is None:
+        print(f"No path found from {start} to {end}.\n")
+    else:
+        print_route(route)
+    return route
+
+# ---------- alternative routes ----------
+#
+# Yen's k shortest loopless paths. every search works on temporary masks
+# (cities and legs it may not use) instead of removing legs from the
+# graph, and the shortest path tree from end doubles as:
+#   - the first route (walking its parents from start)
+#   - a ready-made spur route, whenever its path from the spur city to end
+#     avoids everything masked
+#   - a lower bound of the remaining cost for the A* searches otherwise,
+#     since masking can only make routes longer. the tree is grown only
+#     until start is settled, so cities it did not settle get start's cost
+#     as their bound (nothing unsettled is closer to end than that)
+# paths are (cities, legs) in search keys (ids on a CSRGraph) and legs as
+# the parent maps store them (the weight tuple, or the CSR slot)
+
+# the leg used from u to v, given the leg the tree stored for v to u
+def _forward_leg(graph, u, v, leg):
+    if not isinstance(graph, CSRGraph):
+        return leg
+    first = None
+    for slot in range(graph.offsets[u], graph.offsets[u + 1]):
+        if graph.targets[slot] != v:
+            continue
+        if graph.distances[slot] == graph.distances[leg] and graph.prices[slot] == graph.prices[leg]:
+            return slot
+        if first is None:
+            first = slot
+    return first
+
+# path from city to the tree's root along its parents, None if not reached
+def _tree_path(graph, tree, key):
+    if key not in tree.settled:
+        return None
+    cities = [key]
+    legs = []
+    while tree.parent[key] is not None:
+        previous, leg = tree.parent[key]
+        legs.append(_forward_leg(graph, key, previous, leg))
+        cities.append(previous)
+        key = previous
+    return cities, legs
+
+def _path_allowed(cities, legs, banned_cities, banned_legs):
+    if any(city in banned_cities for city in cities):
+        return False
+    return not any((u, v, leg) in banned_legs for u, v, leg in zip(cities, cities[1:], legs))
 
-    pq = [(0, start, [])]
-    visited = set()
+# lower bound of the cost from a city to the tree's root, None when the
+# city cannot reach it; floor is None for a full tree
+def _cost_bound(tree, floor):
+    cost = tree.cost
+    settled = tree.settled
+    if floor is None:
+        return cost.get
+    return lambda key: cost[key] if key in settled else floor
+
+# A* from source to target around the masked cities and (u, v, leg) legs
+def _masked_search(expand, source, target, bound, banned_cities, banned_legs):
+    started = time.perf_counter()
+    cost = {source: 0}
+    parent = {source: None}
+    settled = set()
+    pq = [(bound(source), 0, source)]
+    stale = 0
+    path = None
 
     while pq:
-        total_cost, current, path = heapq.heappop(pq)
-        if current in visited:
+        _, total_cost, current = heapq.heappop(pq)
+        if current in settled:
+            stale += 1
             continue
-        visited.add(current)
-        path = path + [current]
+        settled.add(current)
+        if current == target:
+            cities = [current]
+            legs = []
+            while parent[current] is not None:
+                current, leg = parent[current]
+                cities.append(current)
+                legs.append(leg)
+            cities.reverse()
+            legs.reverse()
+            path = cities, legs
+            break
+
+        for neighbor, leg_cost, leg in expand(current):
+            if neighbor in settled or neighbor in banned_cities or (current, neighbor, leg) in banned_legs:
+                continue
+            remaining = bound(neighbor)
+            if remaining is None:
+                continue
+            new_cost = total_cost + leg_cost
+            if neighbor not in cost or new_cost < cost[neighbor]:
+                cost[neighbor] = new_cost
+                parent[neighbor] = (current, leg)
+                heapq.heappush(pq, (new_cost + remaining, new_cost, neighbor))
+
+    if instrumentation.enabled:
+        _record_heap_search("masked_astar", started, source, len(settled), stale, len(pq), target=target,
+                            found=path is not None)
+    return path
+
+def _leg_cost(graph, kind, leg):
+    if kind == "stops":
+        return 1
+    if isinstance(graph, CSRGraph):
+        return graph.distances[leg] if kind == "distance" else graph.prices[leg]
+    return leg[0] if kind == "distance" else leg[1]
+
+def _path_route(graph, kind, start, end, cities, legs, cost):
+    if isinstance(graph, CSRGraph):
+        names = graph.names
+        route_legs = [(names[u], names[v], graph.distances[leg], graph.prices[leg])
+                      for u, v, leg in zip(cities, cities[1:], legs)]
+    else:
+        route_legs = [(u, v, leg[0], leg[1]) for u, v, leg in zip(cities, cities[1:], legs)]
+    return make_route(start, end, kind, cost, route_legs)
+
+# the k best loopless routes from start to end, best first (fewer when
+# there are not k of them)
+#
+# pass a RouteCache to reuse (and keep) a full tree from end across queries
+def k_shortest_routes(graph, cost_type, start, end, k=3, cache=None):
+    kind = parse_cost_type(cost_type)
+    if kind is None:
+        raise ValueError(f"invalid cost type {cost_type!r}")
+    if k <= 0:
+        return []
 
-        if current == end:
-            if cost_index == 1:
-                print(f"{title} ${total_cost:.2f}.")
+    if isinstance(graph, CSRGraph):
+        source = graph.ids.get(start)
+        target = graph.ids.get(end)
+    else:
+        source = start if start in graph.adjacency_list else None
+        target = end if end in graph.adjacency_list else None
+    if source is None or target is None:
+        return []
+
+    if cache is not None:
+        tree = cache.tree(kind, end)
+    else:
+        tree = shortest_path_tree(graph, kind, end, [start])
+    first = _tree_path(graph, tree, source)
+    if first is None:
+        return []
+    bound = _cost_bound(tree, None if cache is not None else tree.cost[source])
+
+    expand = _expander(graph, kind)
+    found = [(tree.cost[source], first)]
+    seen = {(tuple(first[0]), tuple(first[1]))}
+    candidates = []
+    counter = 0
+
+    while len(found) < k:
+        _, (cities, legs) = found[-1]
+        root_cost = 0
+        for i in range(len(legs)):
+            spur = cities[i]
+            root = cities[:i + 1]
+            banned_cities = set(root[:-1])
+            banned_legs = set()
+            for _, (other_cities, other_legs) in found:
+                if len(other_legs) > i and other_cities[:i + 1] == root and other_legs[:i] == legs[:i]:
+                    banned_legs.add((spur, other_cities[i + 1], other_legs[i]))
+
+            spur_path = _tree_path(graph, tree, spur)
+            if spur_path is not None and _path_allowed(*spur_path, banned_cities, banned_legs):
+                spur_cost = tree.cost[spur]
             else:
-                print(f"{title} {total_cost} {label}.")
-            for i in range(len(path) - 1):
-                for neighbor, (dist, price) in graph.adjacency_list[path[i]]:
-                    if neighbor == path[i + 1]:
-                        val = (dist, price)[cost_index]
-                        if cost_index == 1:
-                            print(f"{path[i]}\n   ...{path[i+1]} : {val:.2f}")
-                        else:
-                            print(f"{path[i]}\n   ...{path[i+1]} : {val}")
-                        break
-            print()
-            return
+                spur_path = _masked_search(expand, spur, target, bound, banned_cities, banned_legs)
+                spur_cost = None if spur_path is None else \
+                    sum(_leg_cost(graph, kind, leg) for leg in spur_path[1])
 
-        for neighbor, (dist, price) in graph.adjacency_list[current]:
-            if neighbor not in visited:
-                cost = (dist, price)[cost_index]
-                heapq.heappush(pq, (total_cost + cost, neighbor, path))
+            if spur_path is not None:
+                path = (root[:-1] + spur_path[0], legs[:i] + spur_path[1])
+                key = (tuple(path[0]), tuple(path[1]))
+                if key not in seen:
+                    seen.add(key)
+                    counter += 1
+                    heapq.heappush(candidates, (root_cost + spur_cost, counter, path))
+            root_cost += _leg_cost(graph, kind, legs[i])
 
-    print(f"No path found from {start} to {end}.\n")
+        if not candidates:
+            break
+        cost, _, path = heapq.heappop(candidates)
+        found.append((cost, path))
 
-def shortestPathByStops(graph, start, end):
-    queue = deque([(start, [start])])
-    visited = set()
-
-    while queue:
-        current, path = queue.popleft()
-        if current == end:
-            print(f"Path with least stops from ({start}) to ({end}): {len(path) - 1} stops.")
-            for i in range(len(path) - 1):
-                print(f"{path[i]}\n   ...{path[i+1]}")
-            print()
-            return
+    return [_path_route(graph, kind, start, end, cities, legs, cost) for cost, (cities, legs) in found]
+
+# ---------- pareto routes ----------
+
+# neighbors of a city as (neighbor, distance, price, leg), see _expander
+def _leg_expander(graph):
+    if isinstance(graph, CSRGraph):
+        offsets = graph.offsets
+        targets, distances, prices = graph.targets, graph.distances, graph.prices
+        return lambda u: [(targets[slot], distances[slot], prices[slot], slot)
+                          for slot in range(offsets[u], offsets[u + 1])]
+    adjacency = graph.adjacency_list
+    return lambda u: [(v, weight[0], weight[1], weight) for v, weight in adjacency[u]]
+
+# every route from start to end that no other route beats on both
+# distance and price, shortest (and so most expensive) first
+#
+# labels (distance, price) are settled in lexicographic order, so a label
+# is dominated exactly when its city (or end) already has a settled label
+# at least as cheap; that single number per city is all the pruning needs.
+# max_price / max_distance drop labels over the cap as soon as they appear.
+def pareto_routes(graph, start, end, max_price=None, max_distance=None):
+    if isinstance(graph, CSRGraph):
+        source = graph.ids.get(start)
+        target = graph.ids.get(end)
+    else:
+        source = start if start in graph.adjacency_list else None
+        target = end if end in graph.adjacency_list else None
+    if source is None or target is None:
+        return []
+
+    expand = _leg_expander(graph)
+    # label i is (city, parent label, leg), its costs live in the heap entry
+    labels = [(source, None, None)]
+    # cheapest settled price per city
+    best_price = {}
+    found = []
+    pq = [(0, 0.0, 0)]
+
+    while pq:
+        distance, price, label = heapq.heappop(pq)
+        city = labels[label][0]
+        if price >= best_price.get(city, float("inf")) or price >= best_price.get(target, float("inf")):
+            continue
+        best_price[city] = price
+        if city == target:
+            found.append((distance, price, label))
+            continue
+
+        for neighbor, leg_distance, leg_price, leg in expand(city):
+            new_distance = distance + leg_distance
+            new_price = price + leg_price
+            if max_distance is not None and new_distance > max_distance:
+                continue
+            if max_price is not None and new_price > max_price:
+                continue
+            if new_price >= best_price.get(neighbor, float("inf")) or \
+                    new_price >= best_price.get(target, float("inf")):
+                continue
+            labels.append((neighbor, label, leg))
+            heapq.heappush(pq, (new_distance, new_price, len(labels) - 1))
+
+    return [Route(start, end, "pareto", (distance, price), distance, price, _label_legs(graph, labels, label))
+            for distance, price, label in found]
+
+# legs of the route ending at a label, walking parent labels back to start
+def _label_legs(graph, labels, label):
+    csr = isinstance(graph, CSRGraph)
+    legs = []
+    city, previous, leg = labels[label]
+    while previous is not None:
+        src = labels[previous][0]
+        if csr:
+            legs.append((graph.names[src], graph.names[city], graph.distances[leg], graph.prices[leg]))
+        else:
+            legs.append((src, city, leg[0], leg[1]))
+        city, previous, leg = labels[previous]
+    legs.reverse()
+    return legs
+
+# ---------- affordable trips ----------
+
+# a trip is a simple path from start whose leg prices add up to at most
+# the budget; last_distance and last_price describe its final leg
+Trip = namedtuple("Trip", ["start", "cities", "last_distance", "last_price", "cost"])
+
+# city ids, per-city legs [(neighbor id, distance, price), ...] and the
+# price of each city's cheapest leg, built once per search
+#
+# by_price sorts every city's legs by price, which lets counting stop at
+# the first leg over budget but changes the order trips are found in
+def trip_table(graph, by_price=False):
+    if isinstance(graph, CSRGraph):
+        names = graph.names
+        targets, distances, prices = graph.targets, graph.distances, graph.prices
+        legs = [[(targets[slot], distances[slot], prices[slot]) for slot in graph.neighbors(u)]
+                for u in range(len(names))]
+    else:
+        names = list(graph.adjacency_list)
+        ids = {name: i for i, name in enumerate(names)}
+        legs = [[(ids[neighbor], distance, price) for neighbor, (distance, price) in graph.adjacency_list[name]]
+                for name in names]
+    if by_price:
+        for row in legs:
+            row.sort(key=lambda leg: leg[2])
+    cheapest = [min((leg[2] for leg in row), default=float("inf")) for row in legs]
+    return names, legs, cheapest
+
+# depth first search without recursion or copied visited sets: the path
+# and a visited bytearray are extended and undone in place. a city is only
+# expanded when its cheapest leg still fits the budget.
+def _trips_from(table, start, budget):
+    started = time.perf_counter()
+    names, legs, cheapest = table
+    visited = bytearray(len(names))
+    visited[start] = 1
+    path = [start]
+    if 0.0 + cheapest[start] > budget:
+        if instrumentation.enabled:
+            instrumentation.record("trips", started, source=names[start], budget=budget, expanded=0, trips=0)
+        return
+    stack = [[start, 0.0, 0]]
+    # expansions are the calls a recursive search would make
+    expanded = 1
+    found = 0
+
+    while stack:
+        frame = stack[-1]
+        current, total_cost, index = frame
+        row = legs[current]
+        if index == len(row):
+            stack.pop()
+            visited[current] = 0
+            path.pop()
+            continue
+        frame[2] = index + 1
+
+        neighbor, distance, price = row[index]
+        if visited[neighbor]:
+            continue
+        new_cost = total_cost + price
+        if new_cost > budget:
+            continue
+
+        path.append(neighbor)
+        found += 1
+        yield path, distance, price, new_cost
+        if new_cost + cheapest[neighbor] <= budget:
+            visited[neighbor] = 1
+            stack.append([neighbor, new_cost, 0])
+            expanded += 1
+        else:
+            path.pop()
+
+    if instrumentation.enabled:
+        instrumentation.record("trips", started, source=names[start], budget=budget, expanded=expanded, trips=found)
+
+# same search as _trips_from, counting only; table must be built with
+# by_price=True so a city's remaining legs can be skipped at once
+def _count_from(table, start, budget):
+    started = time.perf_counter()
+    names, legs, cheapest = table
+    visited = bytearray(len(names))
+    visited[start] = 1
+    if 0.0 + cheapest[start] > budget:
+        if instrumentation.enabled:
+            instrumentation.record("trip_count", started, source=names[start], budget=budget, expanded=0,
+                                   trips=0)
+        return 0
+    count = 0
+    stack = [[start, 0.0, 0]]
+    expanded = 1
+
+    while stack:
+        frame = stack[-1]
+        current, total_cost, index = frame
+        row = legs[current]
+        if index == len(row):
+            stack.pop()
+            visited[current] = 0
+            continue
+        frame[2] = index + 1
 
-        visited.add(current)
-        for neighbor, _ in graph.adjacency_list[current]:
-            if neighbor not in visited:
-                queue.append((neighbor, path + [neighbor]))
+        neighbor, _, price = row[index]
+        new_cost = total_cost + price
+        if new_cost > budget:
+            # legs are sorted by price, none of the rest fit either
+            frame[2] = len(row)
+            continue
+        if visited[neighbor]:
+            continue
+
+        count += 1
+        if new_cost + cheapest[neighbor] <= budget:
+            visited[neighbor] = 1
+            stack.append([neighbor, new_cost, 0])
+            expanded += 1
+
+    if instrumentation.enabled:
+        instrumentation.record("trip_count", started, source=names[start], budget=budget, expanded=expanded,
+                               trips=count)
+    return count
+
+# per-worker copy of the trip table, sent once when the worker starts
+_worker_table = None
+
+def _init_trip_worker(table):
+    global _worker_table
+    _worker_table = table
+
+def _worker_count(start, budget):
+    return _count_from(_worker_table, start, budget)
+
+def _worker_trips(start, budget):
+    names = _worker_table[0]
+    return [([names[city] for city in path], distance, price, cost)
+            for path, distance, price, cost in _trips_from(_worker_table, start, budget)]
+
+def _start_ids(names, starts):
+    if starts is None:
+        return list(range(len(names)))
+    ids = {name: i for i, name in enumerate(names)}
+    return [ids[city] for city in starts]
+
+# every affordable trip, lazily, in the order allAffordableTrips prints them
+#
+# starts limits the start cities. with workers > 1 each start city is
+# searched in a process pool and its trips are yielded when it finishes
+def affordable_trips(graph, budget, starts=None, workers=None):
+    table = trip_table(graph)
+    names = table[0]
+    start_ids = _start_ids(names, starts)
+
+    if workers is None or workers <= 1:
+        for start in start_ids:
+            for path, distance, price, cost in _trips_from(table, start, budget):
+                yield Trip(names[start], [names[city] for city in path], distance, price, cost)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_trip_worker, initargs=(table,)) as pool:
+        for start, trips in zip(start_ids, pool.map(_worker_trips, start_ids, [budget] * len(start_ids))):
+            for cities, distance, price, cost in trips:
+                yield Trip(names[start], cities, distance, price, cost)
+
+# number of affordable trips without building any of them
+#
+# workers > 1 spreads the start cities over a process pool
+def count_affordable_trips(graph, budget, starts=None, workers=None):
+    table = trip_table(graph, by_price=True)
+    start_ids = _start_ids(table[0], starts)
+
+    if workers is None or workers <= 1:
+        return sum(_count_from(table, start, budget) for start in start_ids)
+
+    from concurrent.futures import ProcessPoolExecutor
 
-    print(f"No path found from {start} to {end}.\n")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_trip_worker, initargs=(table,)) as pool:
+        chunk = max(1, len(start_ids) // (4 * workers))
+        return sum(pool.map(_worker_count, start_ids, [budget] * len(start_ids), chunksize=chunk))
 
 def allAffordableTrips(graph, budget):
-    print(f"All trips under budget ${budget:.2f} (Note: paths're duplicated & reversible):\n")
-    numTrips = 0
+    write_report(trips_report(graph, budget))
+
+# ---------- batch route queries ----------
+#
+# requests are (start, end, cost type). they are grouped by cost type and
+# start, and each group is answered by bidirectional searches until the
+# cities they reached add up to the size of the network; the rest of the
+# group then shares one search tree from start. a few ends are cheapest
+# point to point, many ends from one tree, and switching at that point
+# never costs more than about twice the better of the two. with
+# workers > 1 the groups are spread over a process pool; the graph is
+# frozen into a CSRGraph first and handed to each worker once when it
+# starts (inherited without copying where processes are forked), never
+# with each task.
+
+# per-worker frozen graph, set when the worker starts
+_worker_graph = None
+
+def _init_route_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+def _group_routes(graph, kind, start, ends):
+    size = len(graph.adjacency_list)
+    routes = []
+    reached = 0
+    for end in ends:
+        if reached >= size:
+            tree = shortest_path_tree(graph, kind, start, ends[len(routes):])
+            routes.extend(tree.route(end) for end in ends[len(routes):])
+            break
+        route, searched = _find_route(graph, kind, start, end)
+        routes.append(route)
+        reached += searched
+    return routes
+
+def _worker_routes(kind, start, ends):
+    return _group_routes(_worker_graph, kind, start, ends)
+
+# a Route (or None when there is none) for each request, in request order
+def batch_routes(graph, requests, workers=None):
+    groups = {}
+    count = 0
+    for index, (start, end, cost_type) in enumerate(requests):
+        kind = parse_cost_type(cost_type)
+        if kind is None:
+            raise ValueError(f"request {index}: invalid cost type {cost_type!r}")
+        indices, ends = groups.setdefault((kind, start), ([], []))
+        indices.append(index)
+        ends.append(end)
+        count += 1
+
+    results = [None] * count
+    keys = list(groups)
+    if workers is None or workers <= 1 or len(keys) <= 1:
+        answers = (_group_routes(graph, kind, start, groups[(kind, start)][1]) for kind, start in keys)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
 
-    def dfs(current, start, visited, path, total_cost):
-        nonlocal numTrips
-        visited.add(current)
-        for neighbor, (dist, price) in graph.adjacency_list[current]:
-            if neighbor not in visited:
-                new_cost = total_cost + price
-                if new_cost <= budget:
-                    print(f"({start}):")
-                    print(f"...{current}-{neighbor}, {dist} miles, ${price:.2f}")
-                    print(f"   Total cost: ${new_cost:.2f}.\n")
-                    numTrips += 1
-                    dfs(neighbor, start, visited.copy(), path + [neighbor], new_cost)
+        snapshot = graph if isinstance(graph, CSRGraph) else graph.freeze()
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_route_worker, initargs=(snapshot,))
+        with pool:
+            chunk = max(1, len(keys) // (4 * workers))
+            answers = list(pool.map(_worker_routes, [kind for kind, _ in keys], [start for _, start in keys],
+                                    [groups[key][1] for key in keys], chunksize=chunk))
+
+    for key, routes in zip(keys, answers):
+        for index, route in zip(groups[key][0], routes):
+            results[index] = route
+    return results
+
+# ---------- reports ----------
+#
+# each report is a generator of text chunks, built in one pass over the
+# graph, and write_report sends them through a single buffered writer.
+# the display functions above are write_report(<report>) to stdout.
+
+# per city, its direct routes (neighbor, distance, cost) in the order they
+# were added, straight from the adjacency lists: O(V + E) for the whole
+# network. a route from a city to itself is listed once.
+def edge_index(graph):
+    index = {}
+    for city, edges in graph.adjacency_list.items():
+        routes = []
+        loops = 0
+        for neighbor, (distance, cost) in edges:
+            if neighbor == city:
+                # add_edge stores a loop twice in the same list
+                loops += 1
+                if loops % 2 == 0:
+                    continue
+            routes.append((neighbor, distance, cost))
+        index[city] = routes
+    return index
+
+def direct_routes_report(graph):
+    index = edge_index(graph)
+    connections = set()
+    for city, routes in index.items():
+        for neighbor, _, _ in routes:
+            connections.add((city, neighbor) if city <= neighbor else (neighbor, city))
+    yield f"There are {len(index)} cities and {len(connections)} direct connections.\n\n"
+
+    for city, routes in index.items():
+        lines = [f"({city}):\n"]
+        for neighbor, distance, cost in routes:
+            lines.append(f"   {city}-{neighbor}, {distance} miles, ${cost:.2f}\n")
+        if not routes:
+            lines.append("   (no direct routes)\n")
+        lines.append("\n")
+        yield "".join(lines)
+
+def mst_report(graph, cost_type="distance", algorithm="kruskal"):
+    label = "distance" if _mst_index(cost_type) == 0 else "price"
+    mst = minimum_spanning_tree(graph, cost_type, algorithm)
+    yield "*** MINIMUM SPANNING TREE ***\n"
+    yield f"(The edges in the MST based on {label}):\n"
+    yield "".join(f"{src}-{dst}, {distance} miles, ${cost:.2f}\n" for src, dst, distance, cost in mst)
+    yield "\n"
+
+def trips_report(graph, budget):
+    yield f"All trips under budget ${budget:.2f} (Note: paths're duplicated & reversible):\n\n"
+    numTrips = 0
+    for trip in affordable_trips(graph, budget):
+        current, neighbor = trip.cities[-2], trip.cities[-1]
+        yield (f"({trip.start}):\n"
+               f"...{current}-{neighbor}, {trip.last_distance} miles, ${trip.last_price:.2f}\n"
+               f"   Total cost: ${trip.cost:.2f}.\n\n")
+        numTrips += 1
+    yield f"With the budget, a total {numTrips} trips available.\n\n"
 
-    for city in graph.adjacency_list:
-        dfs(city, city, set(), [city], 0.0)
+# direct routes, MST and (with a budget) trips, one after another
+def network_report(graph, budget=None):
+    yield from direct_routes_report(graph)
+    yield from mst_report(graph)
+    if budget is not None:
+        yield from trips_report(graph, budget)
 
-    print(f"With the budget, a total {numTrips} trips available.\n")
+# write report chunks to out (a stream, or a file name to create, stdout
+# by default), joining them into writes of about buffer_size characters
+def write_report(chunks, out=None, buffer_size=1 << 16):
+    if isinstance(out, (str, os.PathLike)):
+        with open(out, "w", buffering=buffer_size) as file:
+            return write_report(chunks, file, buffer_size)
+    if out is None:
+        out = sys.stdout
 
+    pending = []
+    size = 0
+    written = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        size += len(chunk)
+        if size >= buffer_size:
+            out.write("".join(pending))
+            written += size
+            pending.clear()
+            size = 0
+    if pending:
+        out.write("".join(pending))
+        written += size
+    return written
 
 def main():
     # this is what we will use to grade your project 2
@@ -0,0 +1,244 @@
+# benchmarks for rsa.py
+#
+# usage: python bench.py exp [--sizes 1024 2048 3072 4096] [--repeats 20]
+#        python bench.py suite [--sizes 1024 2048] [--files 1K 1M 100M 2G] [-o out.json]
+#
+# exp compares the modular exponentiation backends (see rsa.EXP_BACKENDS)
+# on private key sized exponents for each modulus size, so a deployment can
+# pick one with rsa.set_exp_backend (or feed the --json output to
+# rsa.set_auto_choices for the "auto" backend)
+#
+# suite measures key generation latency, primality tests per prime,
+# signatures per second and verification throughput and writes JSON, so
+# two versions can be compared run against run
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import rsa
+
+DEFAULT_SIZES = [1024, 2048, 3072, 4096]
+
+# time every backend on the same (base, d, n) values for each modulus size
+#
+# returns {size: {backend: seconds per exponentiation}}, the "binary"
+# backend is skipped above max_binary_bits since it takes seconds per call
+def bench_exp(sizes=DEFAULT_SIZES, repeats=20, seed=435, max_binary_bits=2048):
+    rng = random.Random(seed)
+    results = {}
+    for size in sizes:
+        # a random odd modulus behaves like n for timing purposes, and
+        # avoids generating primes inside the benchmark
+        n = rng.getrandbits(size) | (1 << (size - 1)) | 1
+        d = rng.getrandbits(size) | (1 << (size - 1))
+        bases = [rng.randrange(2, n) for _ in range(repeats)]
+
+        timings = {}
+        for name, backend in rsa.EXP_BACKENDS.items():
+            if name == "binary" and size > max_binary_bits:
+                continue
+            # warm up, this also fills the window recoding cache the way
+            # repeated signatures under the same d would
+            backend(bases[0], d, n)
+            start = time.perf_counter()
+            for base in bases:
+                backend(base, d, n)
+            timings[name] = (time.perf_counter() - start) / repeats
+        timings["fastest"] = min(timings, key=timings.get)
+        results[size] = timings
+    return results
+
+def print_exp_table(results):
+    names = list(rsa.EXP_BACKENDS)
+    print(f"{'bits':>6} " + " ".join(f"{name + ' (ms)':>14}" for name in names) + "   fastest")
+    for size, timings in results.items():
+        cells = []
+        for name in names:
+            cells.append(f"{timings[name] * 1000:>14.3f}" if name in timings else f"{'-':>14}")
+        print(f"{size:>6} " + " ".join(cells) + f"   {timings['fastest']}")
+
+def percentiles(samples, points=(50, 90, 99)):
+    ordered = sorted(samples)
+    result = {}
+    for point in points:
+        # nearest rank percentile
+        rank = max(1, -(-point * len(ordered) // 100))
+        result[f"p{point}"] = ordered[rank - 1]
+    result["min"] = ordered[0]
+    result["max"] = ordered[-1]
+    result["mean"] = sum(ordered) / len(ordered)
+    return result
+
+# key generation latency (seconds) over 'runs' keys of each size, and the
+# number of miller-rabin tests needed per prime found
+def bench_keygen(sizes, runs=10, parallel=False):
+    results = {}
+    for size in sizes:
+        latencies = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            rsa.generate_key(size, parallel=parallel)
+            latencies.append(time.perf_counter() - start)
+
+        # primes are counted in this process so the stats dict sees every test
+        stats = {}
+        for _ in range(2 * runs):
+            rsa.generate_prime(size // 2, stats=stats)
+
+        results[size] = {
+            "runs": runs,
+            "parallel": parallel,
+            "latency": percentiles(latencies),
+            "primality_tests_per_prime": stats["primality_tests"] / (2 * runs),
+            "sieved_per_prime": stats["sieved"] / (2 * runs),
+        }
+    return results
+
+# signatures per second with the CRT key and with the plain (d, n) key
+def bench_sign(keys, seconds=1.0):
+    results = {}
+    for size, key in keys.items():
+        rates = {}
+        for name, signing_key in (("crt", key), ("plain", (key.d, key.n))):
+            count = 0
+            hash_int = random.getrandbits(256)
+            start = time.perf_counter()
+            while True:
+                rsa.sign_hash(hash_int + count, signing_key)
+                count += 1
+                elapsed = time.perf_counter() - start
+                if elapsed >= seconds:
+                    break
+            rates[name] = count / elapsed
+        results[size] = {"signatures_per_second": rates}
+    return results
+
+def parse_size(text):
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+# write a signed file of 'size' content bytes, in chunks so multi-GB files
+# do not need the memory
+def make_signed_file(path, size, key):
+    block = os.urandom(rsa.CHUNK_SIZE)
+    with open(path, "wb") as file:
+        remaining = size
+        while remaining > 0:
+            file.write(block[:min(remaining, len(block))])
+            remaining -= len(block)
+    hash_int = int.from_bytes(rsa.hash_file(path), byteorder="big")
+    signature = rsa.sign_hash(hash_int, key)
+    with open(path, "ab") as file:
+        file.write(signature.to_bytes(rsa.signature_size(key.n), byteorder="big"))
+
+# verification throughput in MB/s for each file size, best of 'repeats'
+def bench_verify(key, file_sizes, repeats=3, directory=None):
+    public_key = (key.e, key.n)
+    results = {}
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        for size in file_sizes:
+            path = os.path.join(tmp, f"bench_{size}.signed")
+            make_signed_file(path, size, key)
+            runs = {}
+            for use_mmap in (False, True):
+                best = None
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    result = rsa.verify_file(path, public_key, use_mmap=use_mmap)
+                    elapsed = time.perf_counter() - start
+                    if not result["authentic"]:
+                        raise RuntimeError(f"benchmark file {path} did not verify")
+                    best = elapsed if best is None else min(best, elapsed)
+                runs["mmap" if use_mmap else "read"] = {
+                    "seconds": best,
+                    "mb_per_second": size / (1 << 20) / best,
+                }
+            os.remove(path)
+            results[size] = runs
+    return results
+
+# modulus and prime sizes the suite exponentiates with, for each key size
+def exp_sizes(sizes):
+    return sorted({bits for size in sizes for bits in (size, size // 2, size - size // 2)})
+
+def run_suite(sizes, file_sizes, runs=10, sign_seconds=1.0, repeats=3, parallel=False, directory=None):
+    # auto times each size class on first use, do it here so it stays out
+    # of the measurements (forked keygen workers inherit the choices)
+    if rsa.get_exp_backend() == "auto":
+        rsa.calibrate_exp_backends(exp_sizes(sizes))
+    keygen = bench_keygen(sizes, runs, parallel)
+    keys = {size: rsa.generate_key(size, parallel=False) for size in sizes}
+    verify_key = keys[sizes[0]]
+    sign = bench_sign(keys, sign_seconds)
+    verify = {
+        "modulus_bits": sizes[0],
+        "files": bench_verify(verify_key, file_sizes, repeats, directory),
+    }
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "exp_backend": rsa.get_exp_backend(),
+            "auto_choices": rsa.auto_exp_choices(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "keygen": keygen,
+        "sign": sign,
+        "verify": verify,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="rsa.py benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    exp = commands.add_parser("exp", help="compare modular exponentiation backends")
+    exp.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    exp.add_argument("--repeats", type=int, default=20)
+    exp.add_argument("--json", action="store_true", help="print JSON instead of a table")
+
+    suite = commands.add_parser("suite", help="key generation, signing and verification")
+    suite.add_argument("--sizes", type=int, nargs="+", default=[1024, 2048])
+    suite.add_argument("--files", nargs="+", default=["1K", "1M", "64M"],
+                       help="content sizes for verification, e.g. 1K 1M 2G")
+    suite.add_argument("--runs", type=int, default=10, help="keys generated per size")
+    suite.add_argument("--sign-seconds", type=float, default=1.0)
+    suite.add_argument("--repeats", type=int, default=3, help="verification runs per file")
+    suite.add_argument("--parallel", action="store_true", help="find p and q in two processes")
+    suite.add_argument("--backend", default="auto", help="exponentiation backend")
+    suite.add_argument("--tmpdir", help="where to write the verification files")
+    suite.add_argument("-o", "--output", help="write JSON here instead of stdout")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "exp":
+        results = bench_exp(args.sizes, args.repeats)
+        if args.json:
+            print(json.dumps(results, indent=2))
+        else:
+            print_exp_table(results)
+        return 0
+
+    rsa.set_exp_backend(args.backend)
+    results = run_suite(args.sizes, [parse_size(size) for size in args.files], args.runs,
+                        args.sign_seconds, args.repeats, args.parallel, args.tmpdir)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
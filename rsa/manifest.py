@@ -0,0 +1,266 @@
+# merkle manifest signing for whole directories
+#
+# usage: python manifest.py sign release_dir [--workers N]
+#        python manifest.py verify release_dir
+#        python manifest.py proof release_dir path/in/tree [-o file.proof]
+#        python manifest.py verify-proof file proof_file
+#
+# every file in the tree becomes a leaf, sha256(0x00 | path | 0x00 | sha256(file)),
+# and each inner node is sha256(0x01 | left | right). a node without a
+# sibling is carried up unchanged. only the root is RSA signed (rsa.sign_hash).
+#
+# the manifest (MANIFEST.json in the directory) keeps each file's size,
+# mtime and digest together with every level of the tree. re-signing hashes
+# only the files whose size or mtime changed, and when the set of files is
+# the same only their leaves and the paths above them are recomputed.
+#
+# a single file is verified with its inclusion proof: the sibling hashes
+# from its leaf to the root plus the signed root, nothing else is hashed
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import rsa
+
+MANIFEST_NAME = "MANIFEST.json"
+
+def leaf_hash(path, digest):
+    return hashlib.sha256(b"\x00" + path.encode() + b"\x00" + bytes.fromhex(digest)).hexdigest()
+
+def node_hash(left, right):
+    return hashlib.sha256(b"\x01" + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+# all levels of the tree, leaves first and the root level ([root]) last
+def build_levels(leaves):
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        below = levels[-1]
+        level = [node_hash(below[i], below[i + 1]) for i in range(0, len(below) - 1, 2)]
+        if len(below) % 2:
+            level.append(below[-1])
+        levels.append(level)
+    return levels
+
+# recompute the given leaf indices and only the nodes above them
+def update_levels(levels, changed):
+    dirty = set(changed)
+    for depth in range(1, len(levels)):
+        below = levels[depth - 1]
+        parents = set()
+        for index in dirty:
+            parent = index // 2
+            if parent in parents:
+                continue
+            parents.add(parent)
+            left = 2 * parent
+            if left + 1 < len(below):
+                levels[depth][parent] = node_hash(below[left], below[left + 1])
+            else:
+                levels[depth][parent] = below[left]
+        dirty = parents
+    return levels
+
+# relative paths (with '/') of every file under directory, sorted
+def list_files(directory, skip=(MANIFEST_NAME,)):
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in files:
+            path = os.path.relpath(os.path.join(root, name), directory).replace(os.sep, "/")
+            if path not in skip:
+                paths.append(path)
+    return sorted(paths)
+
+def _digest(path):
+    return rsa.hash_file(path).hex()
+
+# hash files in a process pool, workers=1 stays in this process
+def hash_files(paths, workers=None):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) <= 1:
+        return [_digest(path) for path in paths]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunk = max(1, len(paths) // (4 * workers))
+        return list(pool.map(_digest, paths, chunksize=chunk))
+
+def read_manifest(directory, name=MANIFEST_NAME):
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+def write_manifest(directory, manifest, name=MANIFEST_NAME):
+    path = os.path.join(directory, name)
+    with open(path + ".tmp", "w") as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(path + ".tmp", path)
+
+# hash the tree, reusing digests and tree levels from 'previous'
+#
+# returns (manifest without a signature, number of files hashed)
+def build_manifest(directory, previous=None, workers=None):
+    paths = list_files(directory)
+    cached = {}
+    if previous is not None:
+        cached = {entry["path"]: entry for entry in previous["files"]}
+
+    files = []
+    stale = []
+    for path in paths:
+        stat = os.stat(os.path.join(directory, path))
+        entry = {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        old = cached.get(path)
+        if old is not None and old["size"] == entry["size"] and old["mtime_ns"] == entry["mtime_ns"]:
+            entry["digest"] = old["digest"]
+        else:
+            stale.append(len(files))
+        files.append(entry)
+
+    digests = hash_files([os.path.join(directory, files[i]["path"]) for i in stale], workers)
+    for index, digest in zip(stale, digests):
+        files[index]["digest"] = digest
+
+    if previous is not None and [entry["path"] for entry in previous["files"]] == paths:
+        # same files in the same places: only changed leaves move
+        levels = [list(level) for level in previous["levels"]]
+        changed = [i for i in stale if previous["files"][i]["digest"] != files[i]["digest"]]
+        for index in changed:
+            levels[0][index] = leaf_hash(paths[index], files[index]["digest"])
+        update_levels(levels, changed)
+    else:
+        levels = build_levels(leaf_hash(entry["path"], entry["digest"]) for entry in files)
+
+    root = levels[-1][0] if levels[0] else hashlib.sha256(b"").hexdigest()
+    manifest = {"version": 1, "root": root, "files": files, "levels": levels}
+    return manifest, len(stale)
+
+def sign_root(root, key):
+    return rsa.sign_hash(int(root, 16), key)
+
+def root_is_signed(root, signature_hex, public_key):
+    return rsa.verify_hash(int(root, 16), int(signature_hex, 16), public_key)
+
+# build (incrementally when MANIFEST.json exists) and sign the manifest
+#
+# returns (manifest, number of files hashed)
+def sign_directory(directory, key, workers=None):
+    previous = read_manifest(directory)
+    manifest, hashed = build_manifest(directory, previous, workers)
+    # signing the single root is cheap, and reusing the old signature
+    # would keep the previous key's after a key rotation
+    manifest["signature"] = format(sign_root(manifest["root"], key), "x")
+    write_manifest(directory, manifest)
+    return manifest, hashed
+
+# check the root signature and re-hash every file against the manifest
+#
+# returns (signature ok, list of paths that are changed, missing or new)
+def verify_directory(directory, public_key):
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f"no {MANIFEST_NAME} in {directory}")
+    signed = root_is_signed(manifest["root"], manifest["signature"], public_key)
+
+    rebuilt, _ = build_manifest(directory, None)
+    recorded = {entry["path"]: entry["digest"] for entry in manifest["files"]}
+    current = {entry["path"]: entry["digest"] for entry in rebuilt["files"]}
+    mismatched = sorted(path for path in recorded.keys() | current.keys()
+                        if recorded.get(path) != current.get(path))
+    signed = signed and rebuilt["root"] == manifest["root"]
+    return signed, mismatched
+
+# sibling hashes from the file's leaf up to the root
+def inclusion_proof(manifest, path):
+    for index, entry in enumerate(manifest["files"]):
+        if entry["path"] == path:
+            break
+    else:
+        raise KeyError(f"{path} is not in the manifest")
+
+    siblings = []
+    for level in manifest["levels"][:-1]:
+        if index % 2:
+            siblings.append(["left", level[index - 1]])
+        elif index + 1 < len(level):
+            siblings.append(["right", level[index + 1]])
+        else:
+            # carried up without a sibling
+            siblings.append(["none", None])
+        index //= 2
+
+    return {
+        "path": path,
+        "siblings": siblings,
+        "root": manifest["root"],
+        "signature": manifest["signature"],
+    }
+
+# verify one file against its proof, hashing only that file
+def verify_proof(file_path, proof, public_key):
+    node = leaf_hash(proof["path"], _digest(file_path))
+    for side, sibling in proof["siblings"]:
+        if side == "left":
+            node = node_hash(sibling, node)
+        elif side == "right":
+            node = node_hash(node, sibling)
+    return node == proof["root"] and root_is_signed(proof["root"], proof["signature"], public_key)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="merkle manifest signing for directories")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sign = commands.add_parser("sign", help="sign (or re-sign) a directory")
+    sign.add_argument("directory")
+    sign.add_argument("--workers", type=int)
+
+    verify = commands.add_parser("verify", help="verify every file of a directory")
+    verify.add_argument("directory")
+
+    proof = commands.add_parser("proof", help="write the inclusion proof of one file")
+    proof.add_argument("directory")
+    proof.add_argument("path", help="path relative to the directory")
+    proof.add_argument("-o", "--output", help="defaults to <file name>.proof here")
+
+    verify_one = commands.add_parser("verify-proof", help="verify one file with its proof")
+    verify_one.add_argument("file")
+    verify_one.add_argument("proof")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "sign":
+        manifest, hashed = sign_directory(args.directory, rsa.default_keyring.private_key(), args.workers)
+        print(f"Signed {len(manifest['files'])} files ({hashed} hashed), root {manifest['root']}")
+        return 0
+
+    if args.command == "verify":
+        signed, mismatched = verify_directory(args.directory, rsa.default_keyring.public_key())
+        for path in mismatched:
+            print(f"{path}: Modified!")
+        print("Authentic!" if signed and not mismatched else "Modified!")
+        return 0 if signed and not mismatched else 1
+
+    if args.command == "proof":
+        manifest = read_manifest(args.directory)
+        if manifest is None:
+            parser.error(f"no {MANIFEST_NAME} in {args.directory}")
+        output = args.output or os.path.basename(args.path) + ".proof"
+        with open(output, "w") as file:
+            json.dump(inclusion_proof(manifest, args.path), file, indent=1)
+        print(f"Proof written to {output}")
+        return 0
+
+    with open(args.proof) as file:
+        proof = json.load(file)
+    authentic = verify_proof(args.file, proof, rsa.default_keyring.public_key())
+    print("Authentic!" if authentic else "Modified!")
+    return 0 if authentic else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
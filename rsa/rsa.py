@@ -2,17 +2,20 @@
 # objective: implement RSA Encryption and apply it to digital signature
 # Htaw Mon (2025)
 
-import pandas as pd
-import numpy as np
+# usage: python rsa.py 1 [--bits 2048]
+#        python rsa.py 2 s file.txt [--detached]
+#        python rsa.py 2 v file.txt.signed   (or file.txt --sig file.txt.sig)
+#        python rsa.py 2 b release_dir ...
+#
+# importing this file does no I/O, modules only some commands need
+# (process pools, mmap, argparse) are imported inside those functions
+
 import hashlib
+import os
 import random
-import time
-
-print (hashlib.algorithms_guaranteed)
-
-h = hashlib.sha256(b'computer science at UA is the best')
-m = h.hexdigest()
-print(m)
+import secrets
+import sys
+from collections import namedtuple
 
 # if 'p' is prime, then for any integer 'a' such that 1 < a < p, we have:
 # a^(p-1) congruent to 1(mod p)
@@ -38,7 +41,7 @@ def FermatPrimalityTest(p):
         base = random.randint(2, p-2)
 
         # check if base^(p-1) is congruent to 1 (mod p)
-        if mod_exp(base, p-1, p) != 1:
+        if modular_exp(base, p-1, p) != 1:
             return a
     return True
 
@@ -60,14 +63,240 @@ def mod_exp(base, exp, mod):
         exp //= 2
     return result
 
-# you need to modify this function to generate two pairs of keys
-def RSA_key_generation():
+# sliding window recoding of an exponent
+#
+# the exponent is split into windows of at most 'window' bits that start
+# and end with a 1 bit, each stored as (squarings before it, odd value).
+# the recoding only depends on the exponent, so it is cached and reused
+# by every exponentiation with the same d
+_recodings = {}
+_RECODING_CACHE_SIZE = 64
+
+def sliding_window_recoding(exp, window):
+    cached = _recodings.get((exp, window))
+    if cached is not None:
+        return cached
+
+    digits = []
+    squarings = 0
+    i = exp.bit_length() - 1
+    while i >= 0:
+        if not (exp >> i) & 1:
+            squarings += 1
+            i -= 1
+            continue
+        # longest window [i..low] of at most 'window' bits ending in a 1
+        low = max(i - window + 1, 0)
+        while not (exp >> low) & 1:
+            low += 1
+        length = i - low + 1
+        digits.append((squarings + length, (exp >> low) & ((1 << length) - 1)))
+        squarings = 0
+        i = low - 1
+    recoding = (tuple(digits), squarings)
+
+    if len(_recodings) >= _RECODING_CACHE_SIZE:
+        _recodings.pop(next(iter(_recodings)))
+    _recodings[(exp, window)] = recoding
+    return recoding
+
+# window size that minimises multiplications for an exponent of this size
+def window_size(bits):
+    for window, limit in ((1, 24), (3, 80), (4, 240), (5, 672), (6, 1792)):
+        if bits <= limit:
+            return window
+    return 7
+
+# sliding window modular exponentiation
+def window_exp(base, exp, mod, window=None):
+    if mod == 1:
+        return 0
+    if window is None:
+        window = window_size(exp.bit_length())
+    digits, trailing = sliding_window_recoding(exp, window)
+
+    # odd powers base^1, base^3, ..., base^(2^window - 1)
+    base = base % mod
+    square = base * base % mod
+    odd_powers = [base]
+    for _ in range((1 << (window - 1)) - 1):
+        odd_powers.append(odd_powers[-1] * square % mod)
+
+    result = 1
+    for squarings, value in digits:
+        for _ in range(squarings):
+            result = result * result % mod
+        result = result * odd_powers[value >> 1] % mod
+    for _ in range(trailing):
+        result = result * result % mod
+    return result
+
+# exponentiation backends, selected with set_exp_backend
+#   binary  - mod_exp, square and multiply one bit at a time
+#   window  - window_exp, sliding window with cached recodings
+#   builtin - python's three argument pow (runs in C)
+#   auto    - whichever of window and builtin is faster for the size of
+#             the modulus. with big exponents window can match or beat
+#             builtin since the time goes to big integer products, and
+#             which one wins depends on the machine, so each size class is
+#             timed once, the first time it is used (calibrate_exp_backends
+#             does it up front, set_auto_choices loads the "fastest" column
+#             of "python bench.py exp --json")
+EXP_BACKENDS = {
+    "binary": mod_exp,
+    "window": window_exp,
+    "builtin": pow,
+}
+
+# moduli are grouped in classes of this many bits for auto
+AUTO_SIZE_STEP = 256
+AUTO_CALIBRATION_REPEATS = 5
+
+# size class -> backend name chosen by auto
+_auto_choices = {}
+
+def _size_class(bits):
+    return max(AUTO_SIZE_STEP, -(-bits // AUTO_SIZE_STEP) * AUTO_SIZE_STEP)
+
+# time window and builtin on a private key sized exponent for each modulus
+# size, and let auto use the faster one; returns {size class: name}
+def calibrate_exp_backends(sizes=(1024, 2048, 3072, 4096), repeats=AUTO_CALIBRATION_REPEATS):
+    import time
+
+    rng = random.Random(435)
+    for size in sizes:
+        n = rng.getrandbits(size) | (1 << (size - 1)) | 1
+        d = rng.getrandbits(size) | (1 << (size - 1))
+        bases = [rng.randrange(2, n) for _ in range(repeats)]
+        timings = {}
+        for name in ("window", "builtin"):
+            backend = EXP_BACKENDS[name]
+            # warm up, this also caches the window recoding of d
+            backend(bases[0], d, n)
+            start = time.perf_counter()
+            for base in bases:
+                backend(base, d, n)
+            timings[name] = time.perf_counter() - start
+        _auto_choices[_size_class(size)] = min(timings, key=timings.get)
+    return dict(_auto_choices)
+
+# load choices measured elsewhere, {modulus bits: name} or the
+# {modulus bits: {"fastest": name, ...}} results of bench.py exp
+def set_auto_choices(choices):
+    for size, choice in choices.items():
+        name = choice["fastest"] if isinstance(choice, dict) else choice
+        if name not in EXP_BACKENDS:
+            raise ValueError(f"unknown exponentiation backend {name!r}")
+        _auto_choices[_size_class(int(size))] = name
+
+def auto_exp_choices():
+    return dict(_auto_choices)
+
+def auto_exp(base, exp, mod):
+    size = _size_class(mod.bit_length())
+    name = _auto_choices.get(size)
+    if name is None:
+        calibrate_exp_backends([size])
+        name = _auto_choices[size]
+    return EXP_BACKENDS[name](base, exp, mod)
+
+_exp_backend = pow
+_exp_backend_name = "builtin"
+
+def set_exp_backend(name):
+    global _exp_backend, _exp_backend_name
+    if name == "auto":
+        _exp_backend = auto_exp
+    elif name in EXP_BACKENDS:
+        _exp_backend = EXP_BACKENDS[name]
+    else:
+        raise ValueError(f"unknown exponentiation backend {name!r}, "
+                         f"choose from {sorted(EXP_BACKENDS) + ['auto']}")
+    _exp_backend_name = name
+
+def get_exp_backend():
+    return _exp_backend_name
+
+# modular exponentiation through the selected backend, used by
+# primality testing, signing and verification
+def modular_exp(base, exp, mod):
+    return _exp_backend(base, exp, mod)
+
+# number of miller-rabin rounds; error probability is at most 4^-rounds
+MILLER_RABIN_ROUNDS = 40
+
+# default modulus size (n) in bits, p and q are half of it each
+DEFAULT_MODULUS_BITS = 512
+
+# smallest modulus generate_key accepts, n has to be larger than a
+# SHA-256 digest or no signature can verify
+MIN_MODULUS_BITS = 512
+
+# sieve of eratosthenes, returns every prime below limit
+def small_primes(limit):
+    is_prime = bytearray([1]) * limit
+    is_prime[0:2] = b"\x00\x00"
+    for i in range(2, int(limit ** 0.5) + 1):
+        if is_prime[i]:
+            is_prime[i*i::i] = bytearray(len(range(i*i, limit, i)))
+    return [i for i in range(limit) if is_prime[i]]
+
+# small primes used to reject most composites before miller-rabin
+# (2 is skipped since candidates are always odd)
+SIEVE_PRIMES = small_primes(2048)[1:]
+
+# miller-rabin primality test
+#
+# write p-1 = 2^s * d with d odd, then for a random base a:
+# a^d congruent to 1 (mod p), or a^(2^r * d) congruent to -1 (mod p) for some r < s
+#
+# if neither holds, p is definitely composite
+def MillerRabinPrimalityTest(p, rounds=MILLER_RABIN_ROUNDS):
+    if p <= 3:
+        return p == 2 or p == 3
+    if p % 2 == 0:
+        return False
+
+    d = p - 1
+    s = 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+
+    for _ in range(rounds):
+        base = random.randint(2, p - 2)
+        x = modular_exp(base, d, p)
+        if x == 1 or x == p - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % p
+            if x == p - 1:
+                break
+        else:
+            return False
+    return True
 
-    p = generate_prime()
-    q = generate_prime()
+# generate a key pair without touching any files
+#
+# p and q are searched for at the same time in two processes unless
+# parallel is False, returns the CRTPrivateKey (which includes e and n)
+def generate_key(modulus_bits=DEFAULT_MODULUS_BITS, rounds=MILLER_RABIN_ROUNDS, parallel=True):
+    if modulus_bits < MIN_MODULUS_BITS:
+        raise ValueError(f"modulus size must be at least {MIN_MODULUS_BITS} bits")
+    prime_bits = modulus_bits // 2
+
+    if parallel:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # find p and q at the same time in two processes
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            p, q = pool.map(generate_prime, [prime_bits, modulus_bits - prime_bits], [rounds, rounds])
+    else:
+        p = generate_prime(prime_bits, rounds)
+        q = generate_prime(modulus_bits - prime_bits, rounds)
     # make sure p and q are different
     while p == q:
-        q = generate_prime()
+        q = generate_prime(modulus_bits - prime_bits, rounds)
 
     n = p*q
     
@@ -80,6 +309,13 @@ def RSA_key_generation():
     # make sure d is positive
     d = d % phi_n if d < 0 else d
 
+    return make_crt_key(d, n, e, p, q)
+
+# you need to modify this function to generate two pairs of keys
+def RSA_key_generation(modulus_bits=DEFAULT_MODULUS_BITS, rounds=MILLER_RABIN_ROUNDS, parallel=True):
+    key = generate_key(modulus_bits, rounds, parallel)
+    n, e, d, p, q = key.n, key.e, key.d, key.p, key.q
+
     # open a file in write mode ('w') and save integers
     with open('p_q.txt', 'w') as file:
         file.write(f"{p}\n")
@@ -89,40 +325,79 @@ def RSA_key_generation():
         file.write(f"{e}\n")
         file.write(f"{n}")
 
+    # d and n stay on the first two lines so older readers keep working,
+    # the rest is the CRT form used by Signing
     with open('d_n.txt', 'w') as file:
-        file.write(f"{d}\n")
-        file.write(f"{n}")
+        file.write("\n".join(str(value) for value in key))
 
     print("done with key generation!")
 
     return n, e, d
 
-def generate_prime():
+# number of odd offsets sieved at once by generate_prime
+SIEVE_WINDOW = 4096
+
+# generate a random prime with exactly 'bits' bits
+#
+# a random odd starting point is picked (from the OS CSPRNG, since it
+# becomes a secret factor), then the window above it is sieved with
+# SIEVE_PRIMES and only the survivors go through miller-rabin
+#
+# if a stats dict is passed, "sieved" and "primality_tests" are added to
+# with the candidates rejected by the sieve and the miller-rabin calls made
+def generate_prime(bits=DEFAULT_MODULUS_BITS // 2, rounds=MILLER_RABIN_ROUNDS, stats=None):
+    if bits < 16:
+        raise ValueError("prime size must be at least 16 bits")
+
     while True:
-        # generate random number between [2^127 to 2^256 -1] and ensure odd (bitwise)
-        candidate = random.randint(2**127, 2**256 - 1) | 1
-        
-        # this ensure that its not a multiple of 5
-        if candidate % 5 == 0:
-            continue
-        
-        if FermatPrimalityTest(candidate):
-            return candidate
+        # top two bits set so p*q has the full modulus size, bottom bit set for odd
+        start = secrets.randbits(bits) | (3 << (bits - 2)) | 1
+
+        # survivor[k] stays 1 while start + 2k has no small prime factor
+        survivor = bytearray([1]) * SIEVE_WINDOW
+        for prime in SIEVE_PRIMES:
+            # first k with (start + 2k) % prime == 0, (prime + 1) // 2 is the inverse of 2
+            k = (-start * ((prime + 1) // 2)) % prime
+            survivor[k::prime] = bytes(len(range(k, SIEVE_WINDOW, prime)))
+
+        found = None
+        tests = 0
+        sieved = 0
+        for k in range(SIEVE_WINDOW):
+            if not survivor[k]:
+                sieved += 1
+                continue
+            candidate = start + 2 * k
+            if candidate.bit_length() != bits:
+                break
+            tests += 1
+            if MillerRabinPrimalityTest(candidate, rounds):
+                found = candidate
+                break
+
+        if stats is not None:
+            stats["primality_tests"] = stats.get("primality_tests", 0) + tests
+            stats["sieved"] = stats.get("sieved", 0) + sieved
+        if found is not None:
+            return found
 
 # extended euclidean algorithm
+#
+# iterative, the recursive form needs one frame per step and runs past
+# python's recursion limit for 2048-bit primes (4096-bit keys)
 def extended_euclidean(a, b):
-    if b == 0:
-        # base case
-        return a, 1, 0
-    # recursive step
-    _, x1, y1 = extended_euclidean(b, a % b)
-
-    # update x and y using result from recursion
-    x = y1
-    y = x1 - (a // b) * y1
+    # invariants: old_r = a*old_x + b*old_y and r = a*x + b*y
+    old_r, r = a, b
+    old_x, x = 1, 0
+    old_y, y = 0, 1
+    while r != 0:
+        quotient = old_r // r
+        old_r, r = r, old_r - quotient * r
+        old_x, x = x, old_x - quotient * x
+        old_y, y = y, old_y - quotient * y
 
     #return gcd, x (modular inverse), and y (coefficient for b)
-    return a, x, y
+    return old_r, old_x, old_y
 
 # finding public key (e)
 def find_e(phi_n):
@@ -140,91 +415,376 @@ def find_e(phi_n):
         if gcd(e, phi_n) == 1:
             return e
         
-# read private key (d, n) from d_n.txt
-def read_private_key():
-    with open("d_n.txt", "r") as file:
-        d = int(file.readline().strip())
-        n = int(file.readline().strip())
+# private key with the chinese remainder theorem values
+#   dP = d mod (p-1), dQ = d mod (q-1), qInv = q^-1 mod p
+CRTPrivateKey = namedtuple("CRTPrivateKey", ["d", "n", "e", "p", "q", "dP", "dQ", "qInv"])
+
+def make_crt_key(d, n, e, p, q):
+    _, q_inv, _ = extended_euclidean(q, p)
+    return CRTPrivateKey(d, n, e, p, q, d % (p - 1), d % (q - 1), q_inv % p)
+
+# binary key files start with this tag, followed by each integer as a
+# 4-byte big-endian length and then its big-endian bytes
+BINARY_KEY_MAGIC = b"RSAK"
+
+def write_binary_key(path, key):
+    with open(path, "wb") as file:
+        file.write(BINARY_KEY_MAGIC)
+        for value in key:
+            data = value.to_bytes((value.bit_length() + 7) // 8, byteorder="big")
+            file.write(len(data).to_bytes(4, byteorder="big"))
+            file.write(data)
+
+# read the integers of a key file, text (one per line) or binary
+def read_key_values(path):
+    with open(path, "rb") as file:
+        data = file.read()
+
+    if not data.startswith(BINARY_KEY_MAGIC):
+        return [int(value) for value in data.split()]
+
+    values = []
+    pos = len(BINARY_KEY_MAGIC)
+    while pos < len(data):
+        size = int.from_bytes(data[pos:pos + 4], byteorder="big")
+        pos += 4
+        values.append(int.from_bytes(data[pos:pos + size], byteorder="big"))
+        pos += size
+    return values
+
+# returns (d, n) for the old two value format, or a CRTPrivateKey when the
+# file also has e, p, q, dP, dQ and qInv
+def private_key_from_values(values):
+    if len(values) == len(CRTPrivateKey._fields):
+        return CRTPrivateKey(*values)
+    d, n = values[:2]
     return d, n
 
-# read public key (e, n) from e_n.txt
-def read_public_key():
-    with open("e_n.txt", "r") as file:
-        e = int(file.readline().strip())
-        n = int(file.readline().strip())
+# read private key from d_n.txt (or another text or binary key file)
+def read_private_key(path="d_n.txt"):
+    return private_key_from_values(read_key_values(path))
+
+# read public key (e, n) from e_n.txt (or another text or binary key file)
+def read_public_key(path="e_n.txt"):
+    e, n = read_key_values(path)[:2]
     return e, n
 
-# sign file using RSA private key
-def Signing(doc, key):
-    d, n = key
+# named key pairs, parsed on first use and kept in memory
+#
+# each access stats the key file and parses it again only when its
+# modification time or size changed, so signing many documents pays the
+# parsing cost once
+class Keyring:
+    def __init__(self, directory="."):
+        self.directory = directory
+        # name -> (private key file, public key file)
+        self.pairs = {}
+        # path -> ((mtime, size), parsed key)
+        self.cache = {}
+
+    def add(self, name, private_file="d_n.txt", public_file="e_n.txt"):
+        self.pairs[name] = (self.path(private_file), self.path(public_file))
+
+    def remove(self, name):
+        for path in self.pairs.pop(name, ()):
+            self.cache.pop(path, None)
+
+    def path(self, file_name):
+        if file_name is None:
+            return None
+        return os.path.join(self.directory, file_name)
+
+    def private_key(self, name="default"):
+        return self.load(self.pair(name)[0], read_private_key)
+
+    def public_key(self, name="default"):
+        return self.load(self.pair(name)[1], read_public_key)
+
+    def pair(self, name):
+        if name not in self.pairs:
+            raise KeyError(f"no key pair named {name!r}")
+        return self.pairs[name]
+
+    def load(self, path, reader):
+        if path is None:
+            raise KeyError("key pair has no such key file")
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cached = self.cache.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        key = reader(path)
+        self.cache[path] = (stamp, key)
+        return key
+
+    def invalidate(self, name=None):
+        if name is None:
+            self.cache.clear()
+            return
+        for path in self.pair(name):
+            self.cache.pop(path, None)
+
+    # write the pair as .bin files next to the text ones and use those from now on
+    def save_binary(self, name="default"):
+        private_file, public_file = self.pair(name)
+        binary_files = []
+        for path, reader in ((private_file, read_private_key), (public_file, read_public_key)):
+            if path is None:
+                binary_files.append(None)
+                continue
+            binary_path = os.path.splitext(path)[0] + ".bin"
+            write_binary_key(binary_path, self.load(path, reader))
+            binary_files.append(binary_path)
+        self.pairs[name] = tuple(binary_files)
+        return self.pairs[name]
+
+# keyring used by CPSC_435_Project1, "default" is d_n.txt / e_n.txt in the
+# working directory
+default_keyring = Keyring()
+default_keyring.add("default")
+
+# raw RSA signature of an integer hash
+def sign_hash(hash_int, key):
+    if not isinstance(key, CRTPrivateKey):
+        d, n = key
+        return modular_exp(hash_int, d, n)
+
+    # two half size exponentiations, then recombine (garner's formula)
+    m1 = modular_exp(hash_int, key.dP, key.p)
+    m2 = modular_exp(hash_int, key.dQ, key.q)
+    h = (key.qInv * (m1 - m2)) % key.p
+    signature = m2 + h * key.q
+
+    # fault check: a wrong CRT half would leak p, so never release it unverified
+    if modular_exp(signature, key.e, key.n) != hash_int % key.n:
+        signature = modular_exp(hash_int, key.d, key.n)
+        if modular_exp(signature, key.e, key.n) != hash_int % key.n:
+            raise ArithmeticError("RSA signature failed verification")
+    return signature
+
+# files are hashed and copied in chunks of this size, so memory use
+# stays the same no matter how large the document is
+CHUNK_SIZE = 1 << 20
+
+# sha-256 of the first 'length' bytes of a file (the whole file by default)
+#
+# use_mmap hashes through a read-only memory map instead of read() calls
+def hash_file(path, length=None, use_mmap=False):
+    h = hashlib.sha256()
+    with open(path, "rb") as file:
+        if length is None:
+            length = os.fstat(file.fileno()).st_size
+
+        if use_mmap and length > 0:
+            import mmap
+
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                for offset in range(0, length, CHUNK_SIZE):
+                    h.update(view[offset:min(offset + CHUNK_SIZE, length)])
+            return h.digest()
+
+        buffer = bytearray(CHUNK_SIZE)
+        chunk = memoryview(buffer)
+        remaining = length
+        while remaining > 0:
+            read = file.readinto(chunk[:min(CHUNK_SIZE, remaining)])
+            if not read:
+                break
+            h.update(chunk[:read])
+            remaining -= read
+    return h.digest()
+
+def signature_size(n):
+    return (n.bit_length() + 7) // 8
 
-    # read original file content
-    with open(doc, "rb") as file:
-        content = file.read()
+# sign file using RSA private key
+#
+# by default writes doc.signed (a copy of doc with the signature appended),
+# with detached=True only the signature is written, to doc.sig
+def Signing(doc, key, detached=False, use_mmap=False):
+    n = key[1]
 
     # sha-256 hash of file content
-    hash_value = hashlib.sha256(content).digest()
+    hash_value = hash_file(doc, use_mmap=use_mmap)
     hash_int = int.from_bytes(hash_value, byteorder="big")
 
     # signing
-    signature = mod_exp(hash_int, d, n)
+    signature = sign_hash(hash_int, key)
+
+    # convert signature to bytes for appending to original content
+    # (64 bytes for the default 512-bit modulus)
+    signature_bytes = signature.to_bytes(signature_size(n), byteorder="big", signed=False)
 
-    # convert signature to 64-byte for appending to original content
-    # because n is slightly less than 512 bits (64 bytes)
-    signature_bytes = signature.to_bytes((n.bit_length() + 7) // 8, byteorder="big", signed=False)
+    if detached:
+        signed_file = doc + ".sig"
+        with open(signed_file, "wb") as file:
+            file.write(signature_bytes)
+        print("\nSigned (detached) ...")
+        return signed_file
+
+    import shutil
 
     # save signed file
     signed_file = doc + ".signed"
-    with open(signed_file, "wb") as file:
-        # write the original file content
-        file.write(content)
+    with open(doc, "rb") as source, open(signed_file, "wb") as file:
+        # copy the original file content
+        shutil.copyfileobj(source, file, CHUNK_SIZE)
         # append the signature
         file.write(signature_bytes)
 
     print("\nSigned ...")
     return signed_file
 
-# verify signed file
-def verification(doc, key):
+# check a raw RSA signature against an integer hash
+def verify_hash(hash_int, signature_int, key):
     e, n = key
+    # prevent invalid signature crash
+    if signature_int >= n:
+        return False
+    return modular_exp(signature_int, e, n) == hash_int
 
-    # read signed file
-    with open(doc, "rb") as file:
-        content = file.read()
+# verify one signed file without printing
+#
+# doc is a .signed file unless signature_file (a detached .sig) is given,
+# in which case doc is the untouched original
+#
+# returns a dict with the file name, whether it is authentic and an error
+# message (None when the signature could be checked at all)
+def verify_file(doc, key, signature_file=None, use_mmap=False):
+    n = key[1]
+    result = {"file": doc, "authentic": False, "error": None}
 
     # determine signature size dynamically
-    sig_size = (n.bit_length() + 7) // 8
+    sig_size = signature_size(n)
+
+    try:
+        if signature_file is not None:
+            with open(signature_file, "rb") as file:
+                signature_bytes = file.read()
+            content_size = os.path.getsize(doc)
+            if len(signature_bytes) != sig_size:
+                result["error"] = "Signature file has the wrong size."
+                return result
+        else:
+            content_size = os.path.getsize(doc) - sig_size
 
-    # extract original content and signature
-    if len(content) < sig_size:
-        print("\nError: File too small to contain a valid signature.")
-        return False
+            # extract original content and signature
+            if content_size < 0:
+                result["error"] = "File too small to contain a valid signature."
+                return result
 
-    original_content = content[:-sig_size]
-    signature_bytes = content[-sig_size:]
+            # the signature is the last sig_size bytes
+            with open(doc, "rb") as file:
+                file.seek(content_size)
+                signature_bytes = file.read(sig_size)
+
+        # compute sha-256 of the original content
+        new_hash_value = hash_file(doc, content_size, use_mmap=use_mmap)
+    except OSError as error:
+        result["error"] = str(error)
+        return result
 
-    # compute sha-256 of the extracted original file
-    new_hash_value = hashlib.sha256(original_content).digest()
     new_hash_int = int.from_bytes(new_hash_value, byteorder="big")
 
     # convert signature_bytes to int
     signature_int = int.from_bytes(signature_bytes, byteorder="big")
 
-    # prevent invalid signature crash
     if signature_int >= n:
-        print("\nError: Signature is invalid (too large).")
-        return False
+        result["error"] = "Signature is invalid (too large)."
+        return result
 
-    # decrypt
-    decrypted_signature = mod_exp(signature_int, e, n)
+    result["authentic"] = verify_hash(new_hash_int, signature_int, key)
+    return result
+
+# verify signed file
+def verification(doc, key, signature_file=None, use_mmap=False):
+    result = verify_file(doc, key, signature_file, use_mmap)
+
+    if result["error"] is not None:
+        print(f"\nError: {result['error']}")
+        return False
 
     # compare decrypt with new hash
-    if decrypted_signature == new_hash_int:
+    if result["authentic"]:
         print("\nAuthentic!")
     else:
         print("\nModified!")
-    
-    return decrypted_signature == new_hash_int
+
+    return result["authentic"]
+
+# expand files and directories into (signed file, detached signature) pairs
+#
+# inside a directory every *.signed file is checked, and every *.sig file
+# is checked against the file it was made from
+def collect_signed_files(targets):
+    if isinstance(targets, str):
+        targets = [targets]
+
+    jobs = []
+    for target in targets:
+        if not os.path.isdir(target):
+            if target.endswith(".sig"):
+                jobs.append((target[:-len(".sig")], target))
+            else:
+                jobs.append((target, None))
+            continue
+
+        for root, dirs, files in os.walk(target):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                if name.endswith(".signed"):
+                    jobs.append((path, None))
+                elif name.endswith(".sig"):
+                    jobs.append((path[:-len(".sig")], path))
+    return jobs
+
+def _verify_job(job, key):
+    doc, signature_file = job
+    return verify_file(doc, key, signature_file)
+
+# verify many signed files at once
+#
+# targets is a file, a directory or a list of them (see collect_signed_files),
+# key defaults to e_n.txt and is parsed once for the whole batch
+#
+# hashing and exponentiation run in a process pool of 'workers' processes
+# (os.cpu_count() by default, 1 to stay in this process)
+#
+# returns (results, summary), one result dict per file in collection order
+def batch_verification(targets, key=None, workers=None):
+    if key is None:
+        key = default_keyring.public_key()
+    jobs = collect_signed_files(targets)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        results = [_verify_job(job, key) for job in jobs]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # a few chunks per worker keeps the pool busy without per-file overhead
+            chunk = max(1, len(jobs) // (4 * workers))
+            results = list(pool.map(_verify_job, jobs, [key] * len(jobs), chunksize=chunk))
+
+    summary = {
+        "total": len(results),
+        "authentic": sum(1 for r in results if r["authentic"]),
+        "modified": sum(1 for r in results if not r["authentic"] and r["error"] is None),
+        "errors": sum(1 for r in results if r["error"] is not None),
+    }
+    return results, summary
+
+# print the failures of a batch verification and the summary line
+def print_batch_results(results, summary):
+    for result in results:
+        if result["error"] is not None:
+            print(f"{result['file']}: Error: {result['error']}")
+        elif not result["authentic"]:
+            print(f"{result['file']}: Modified!")
+    print(f"\n{summary['authentic']}/{summary['total']} authentic, "
+          f"{summary['modified']} modified, {summary['errors']} errors")
 
 # No need to change the main function.
 # 
@@ -234,28 +794,71 @@ def CPSC_435_Project1(part, task="", fileName=""):
         RSA_key_generation()
     # part II, command-line will be for example: python yourProgram.py 2 s file.txt
     #                                       or   python yourProgram.py 2 v file.txt.signed
+    #                                       or   python yourProgram.py 2 b release_dir
     else:
         if "s" in task:  # do signing
             doc = fileName   # you figure out
-            key = read_private_key()   # you figure out
+            key = default_keyring.private_key()   # you figure out
             Signing(doc, key)
+        elif "b" in task:
+            # batch verification of a file or directory
+            results, summary = batch_verification(fileName)
+            print_batch_results(results, summary)
         else:
             # do verification
             doc = fileName   # you figure out
-            key = read_public_key()   # you figure out
+            key = default_keyring.public_key()   # you figure out
             verification(doc, key)
 
     print("done!")
     
     return
 
-# when we grade your part 1 - RSA_key_generation
-CPSC_435_Project1(1)
-
-# when we grade your part 2a - signing
-docName = "contract.txt" # the fileName is just an example
-CPSC_435_Project1(2, "s", docName)
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="RSA key generation and digital signatures")
+    parser.add_argument("part", type=int, choices=[1, 2], help="1: generate keys, 2: sign or verify")
+    parser.add_argument("task", nargs="?", default="", help="s: sign, v: verify, b: batch verify")
+    parser.add_argument("files", nargs="*", help="document, signed file or directories")
+    parser.add_argument("--bits", type=int, default=DEFAULT_MODULUS_BITS,
+                        help=f"modulus size for part 1, at least {MIN_MODULUS_BITS}")
+    parser.add_argument("--detached", action="store_true", help="write doc.sig instead of doc.signed")
+    parser.add_argument("--sig", help="detached signature to verify the document against")
+    parser.add_argument("--workers", type=int, help="processes for batch verification")
+    args = parser.parse_args(argv)
+
+    if args.part == 1:
+        try:
+            RSA_key_generation(args.bits)
+        except ValueError as error:
+            parser.error(str(error))
+        print("done!")
+        return 0
+
+    if not args.task or not args.files:
+        parser.error("part 2 needs a task and at least one file")
+
+    if "s" in args.task:
+        key = default_keyring.private_key()
+        for doc in args.files:
+            Signing(doc, key, detached=args.detached)
+        print("done!")
+        return 0
+
+    if "b" in args.task:
+        results, summary = batch_verification(args.files, workers=args.workers)
+        print_batch_results(results, summary)
+        return 0 if summary["authentic"] == summary["total"] else 1
+
+    # a detached signature belongs to one document
+    if args.sig and len(args.files) != 1:
+        parser.error("--sig needs exactly one file")
+
+    key = default_keyring.public_key()
+    authentic = all([verification(doc, key, signature_file=args.sig) for doc in args.files])
+    print("done!")
+    return 0 if authentic else 1
 
-# when we grade your part 2b - verification
-docName = "contract.txt.signed" # the fileName is just an example
-CPSC_435_Project1(2, "v", docName)
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,394 @@
+# local signing daemon for rsa.py
+#
+# usage: python signd.py serve [--socket rsa-signd.sock] [--keys-dir .] [--key name=d_n.txt:e_n.txt]
+#        python signd.py sign file.txt [--key name]
+#        python signd.py verify file.txt.signed [--key name]
+#        python signd.py metrics
+#
+# the daemon keeps keys in memory (through rsa.Keyring) and listens on a
+# unix domain socket. clients send the sha-256 of a document, never the
+# document itself, as one JSON object per line:
+#
+#   {"id": 1, "op": "sign", "key": "default", "hash": "<64 hex digits>"}
+#   -> {"id": 1, "signature": "<hex>"}
+#   {"id": 2, "op": "verify", "key": "default", "hash": "...", "signature": "..."}
+#   -> {"id": 2, "authentic": true}
+#   {"id": 3, "op": "public_key", "key": "default"}
+#   -> {"id": 3, "e": "<hex>", "n": "<hex>"}
+#   {"id": 4, "op": "metrics"}
+#   -> {"id": 4, "metrics": {...}}
+#
+# failures come back as {"id": ..., "error": "message"}. requests that
+# arrive within batch_delay of each other are sent to the worker pool
+# together, and once max_pending requests are waiting the daemon stops
+# reading from clients until the pool catches up. if a worker process
+# dies, the batches it took down get an error reply and the pool is
+# replaced
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import rsa
+
+DEFAULT_SOCKET = "rsa-signd.sock"
+
+# ---------- worker pool side ----------
+
+def sign_batch(key, hashes):
+    return [rsa.sign_hash(hash_int, key) for hash_int in hashes]
+
+def verify_batch(key, pairs):
+    return [rsa.verify_hash(hash_int, signature, key) for hash_int, signature in pairs]
+
+# ---------- daemon ----------
+
+class Metrics:
+    def __init__(self, window=10000):
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.pool_restarts = 0
+        # latencies (seconds) of the most recent requests
+        self.latencies = deque(maxlen=window)
+
+    def record(self, latency, error=False):
+        self.requests += 1
+        if error:
+            self.errors += 1
+        self.latencies.append(latency)
+
+    def snapshot(self, pending):
+        ordered = sorted(self.latencies)
+        result = {
+            "uptime": time.time() - self.started,
+            "requests": self.requests,
+            "errors": self.errors,
+            "pending": pending,
+            "batches": self.batches,
+            "mean_batch_size": self.batched_requests / self.batches if self.batches else 0.0,
+            "pool_restarts": self.pool_restarts,
+        }
+        for point in (50, 90, 99):
+            if ordered:
+                rank = max(1, -(-point * len(ordered) // 100))
+                result[f"latency_p{point}_ms"] = ordered[rank - 1] * 1000
+            else:
+                result[f"latency_p{point}_ms"] = None
+        return result
+
+class SigningDaemon:
+    def __init__(self, keyring, workers=None, batch_size=64, batch_delay=0.002, max_pending=1024):
+        self.keyring = keyring
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.max_pending = max_pending
+        self.metrics = Metrics()
+        self.pool = None
+        self.queue = None
+        self.server = None
+        self.batcher = None
+        # batches handed to the pool and not finished yet
+        self.slots = None
+
+    async def start(self, path):
+        loop = asyncio.get_running_loop()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.queue = asyncio.Queue(maxsize=self.max_pending)
+        self.slots = asyncio.Semaphore(2 * self.workers)
+        self.batcher = loop.create_task(self.run_batches())
+        self.batcher.add_done_callback(self.batcher_done)
+        if os.path.exists(path):
+            os.remove(path)
+        self.server = await asyncio.start_unix_server(self.handle_client, path=path)
+        os.chmod(path, 0o600)
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+        if self.batcher is not None:
+            if self.batcher.done() and not self.batcher.cancelled() and self.batcher.exception() is not None:
+                raise RuntimeError("signing daemon batcher died") from self.batcher.exception()
+            self.batcher.cancel()
+
+    # the batcher only stops on an unexpected error: stop serving then, so
+    # requests are not left waiting on a queue nobody reads
+    def batcher_done(self, task):
+        if task.cancelled() or task.exception() is None:
+            return
+        print(f"signing daemon batcher died: {task.exception()!r}", file=sys.stderr)
+        if self.server is not None:
+            self.server.close()
+
+    # replace a pool whose worker died; a pool that was already replaced
+    # is left alone
+    def restart_pool(self, broken):
+        if self.pool is not broken:
+            return
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.metrics.pool_restarts += 1
+
+    async def handle_client(self, reader, writer):
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                received = time.perf_counter()
+                request = None
+                try:
+                    request = json.loads(line)
+                    job = self.parse(request)
+                except (ValueError, KeyError, TypeError, AttributeError, OSError) as error:
+                    request = request if isinstance(request, dict) else {}
+                    self.reply(writer, {"id": request.get("id"), "error": str(error)}, received, True)
+                    continue
+
+                if not isinstance(job, tuple):
+                    # answered right away, no exponentiation needed
+                    job["id"] = request.get("id")
+                    self.reply(writer, job, received)
+                    continue
+
+                future = asyncio.get_running_loop().create_future()
+                # waits here when max_pending requests are queued (back-pressure)
+                await self.queue.put((job, future))
+                task = asyncio.ensure_future(self.respond(writer, request.get("id"), future, received))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                await writer.drain()
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+
+    # turn a request into (op, key name, key, argument) for the pool, or
+    # into the response dict itself for requests that need no pool work
+    def parse(self, request):
+        op = request.get("op")
+        if op not in ("metrics", "public_key", "sign", "verify"):
+            raise ValueError(f"unknown op {op!r}")
+        if op == "metrics":
+            return {"metrics": self.metrics.snapshot(self.queue.qsize())}
+        name = request.get("key", "default")
+        if op == "public_key":
+            e, n = self.keyring.public_key(name)
+            return {"e": format(e, "x"), "n": format(n, "x")}
+        hash_int = int(request["hash"], 16)
+        if op == "sign":
+            return ("sign", name, self.keyring.private_key(name), hash_int)
+        signature = int(request["signature"], 16)
+        return ("verify", name, self.keyring.public_key(name), (hash_int, signature))
+
+    async def respond(self, writer, request_id, future, received):
+        try:
+            response = {"id": request_id}
+            response.update(await future)
+            error = False
+        except Exception as failure:
+            response = {"id": request_id, "error": str(failure)}
+            error = True
+        self.reply(writer, response, received, error)
+
+    def reply(self, writer, response, received, error=False):
+        self.metrics.record(time.perf_counter() - received, error)
+        if not writer.is_closing():
+            writer.write(json.dumps(response).encode() + b"\n")
+
+    # collect queued requests into batches and hand them to the pool
+    async def run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_delay
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # one pool task per (op, key) so each worker call uses a single key
+            groups = {}
+            for job, future in batch:
+                op, name, key, argument = job
+                groups.setdefault((op, name), (key, [], []))
+                groups[(op, name)][1].append(argument)
+                groups[(op, name)][2].append(future)
+
+            for (op, _), (key, arguments, futures) in groups.items():
+                await self.slots.acquire()
+                self.metrics.batches += 1
+                self.metrics.batched_requests += len(arguments)
+                function = sign_batch if op == "sign" else verify_batch
+                pool = self.pool
+                try:
+                    task = loop.run_in_executor(pool, function, key, arguments)
+                except (BrokenProcessPool, RuntimeError) as error:
+                    # a worker died (or the pool was shut down): fail this
+                    # batch and carry on with a fresh pool
+                    self.slots.release()
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(error)
+                    self.restart_pool(pool)
+                    continue
+                task.add_done_callback(lambda done, op=op, key=key, futures=futures, pool=pool:
+                                       self.finish(done, op, key, futures, pool))
+
+    def finish(self, done, op, key, futures, pool):
+        self.slots.release()
+        error = done.exception()
+        if isinstance(error, BrokenProcessPool):
+            self.restart_pool(pool)
+        for index, future in enumerate(futures):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            elif op == "sign":
+                future.set_result({"signature": format(done.result()[index], "x"),
+                                   "size": rsa.signature_size(key[1])})
+            else:
+                future.set_result({"authentic": done.result()[index]})
+
+async def serve(path, keyring, **options):
+    daemon = SigningDaemon(keyring, **options)
+    server = await daemon.start(path)
+    print(f"signing daemon listening on {path}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await daemon.close()
+        if os.path.exists(path):
+            os.remove(path)
+
+# ---------- client ----------
+
+# blocking client for worker processes, one connection per instance
+class SigningClient:
+    def __init__(self, path=DEFAULT_SOCKET):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.file = self.sock.makefile("rwb")
+        self.next_id = 0
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def request(self, **request):
+        self.next_id += 1
+        request["id"] = self.next_id
+        self.file.write(json.dumps(request).encode() + b"\n")
+        self.file.flush()
+        response = json.loads(self.file.readline())
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response
+
+    # returns the signature as big-endian bytes of the modulus size
+    def sign_hash(self, digest, key="default"):
+        response = self.request(op="sign", key=key, hash=digest.hex())
+        return int(response["signature"], 16).to_bytes(response["size"], byteorder="big")
+
+    def verify_hash(self, digest, signature_bytes, key="default"):
+        response = self.request(op="verify", key=key, hash=digest.hex(), signature=signature_bytes.hex())
+        return response["authentic"]
+
+    def public_key(self, key="default"):
+        response = self.request(op="public_key", key=key)
+        return int(response["e"], 16), int(response["n"], 16)
+
+    def metrics(self):
+        return self.request(op="metrics")["metrics"]
+
+# ---------- command line ----------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="local RSA signing daemon")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="unix socket path")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_command = commands.add_parser("serve", help="run the daemon")
+    serve_command.add_argument("--keys-dir", default=".", help="directory holding the key files")
+    serve_command.add_argument("--key", action="append", default=[],
+                               help="name=private_file:public_file, default is default=d_n.txt:e_n.txt")
+    serve_command.add_argument("--workers", type=int, help="signing processes")
+    serve_command.add_argument("--batch-size", type=int, default=64)
+    serve_command.add_argument("--batch-delay", type=float, default=0.002, help="seconds")
+    serve_command.add_argument("--max-pending", type=int, default=1024)
+
+    for name in ("sign", "verify"):
+        command = commands.add_parser(name, help=f"{name} a file through the daemon")
+        command.add_argument("file")
+        command.add_argument("--key", default="default")
+    commands.add_parser("metrics", help="print daemon metrics")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        keyring = rsa.Keyring(args.keys_dir)
+        for spec in args.key or ["default=d_n.txt:e_n.txt"]:
+            name, _, files = spec.partition("=")
+            private_file, _, public_file = files.partition(":")
+            keyring.add(name, private_file or None, public_file or None)
+        try:
+            asyncio.run(serve(args.socket, keyring, workers=args.workers, batch_size=args.batch_size,
+                              batch_delay=args.batch_delay, max_pending=args.max_pending))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    with SigningClient(args.socket) as client:
+        if args.command == "metrics":
+            print(json.dumps(client.metrics(), indent=2))
+            return 0
+
+        if args.command == "sign":
+            signature_bytes = client.sign_hash(rsa.hash_file(args.file), args.key)
+            with open(args.file + ".sig", "wb") as file:
+                file.write(signature_bytes)
+            print(f"Signed ... {args.file}.sig")
+            return 0
+
+        # verify a .signed file: split off the trailing signature locally
+        sig_size = rsa.signature_size(client.public_key(args.key)[1])
+        content_size = os.path.getsize(args.file) - sig_size
+        if content_size < 0:
+            print("Error: File too small to contain a valid signature.")
+            return 1
+        with open(args.file, "rb") as file:
+            file.seek(content_size)
+            signature_bytes = file.read(sig_size)
+        authentic = client.verify_hash(rsa.hash_file(args.file, content_size), signature_bytes, args.key)
+        print("Authentic!" if authentic else "Modified!")
+        return 0 if authentic else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
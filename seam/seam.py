@@ -84,57 +84,137 @@ def compute_energy(img):
     return energy
 
 # ---------- Vertical Seam Functions ----------
-def find_vertical_seam(energy):
-    h, w = energy.shape
+# cheapest of the three parents of every pixel in a line, given the
+# cumulative costs of the line before it: start from the pixel straight
+# above, then take the upper-left and then the upper-right parent only if
+# strictly cheaper, so ties resolve exactly as in a pixel-by-pixel scan
+def cheapest_parents(above, positions):
+    min_cost = above.copy()
+    idx = positions.copy()
+
+    left = above[:-1] < min_cost[1:]
+    min_cost[1:][left] = above[:-1][left]
+    idx[1:][left] = positions[:-1][left]
+
+    right = above[1:] < min_cost[:-1]
+    min_cost[:-1][right] = above[1:][right]
+    idx[:-1][right] = positions[1:][right]
+    return min_cost, idx
+
+# minimum seam through the energy array, one line at a time: vertical
+# seams take one column per row, horizontal ones one row per column
+# (searched in place, the same way a vertical seam of the transposed
+# image would be). returns the chosen index for each line.
+def find_seam(energy, vertical=True):
     cost = energy.copy()
     back = np.zeros_like(cost, dtype=int)
+    if vertical:
+        lines, length = cost.shape
+        line = lambda a, k: a[k]
+    else:
+        length, lines = cost.shape
+        line = lambda a, k: a[:, k]
+    positions = np.arange(length)
+
+    for k in range(1, lines):
+        min_cost, idx = cheapest_parents(line(cost, k - 1), positions)
+        line(cost, k)[:] += min_cost
+        line(back, k)[:] = idx
+
+    seam = np.empty(lines, dtype=int)
+    j = int(np.argmin(line(cost, lines - 1)))
+    for k in range(lines - 1, -1, -1):
+        seam[k] = j
+        j = line(back, k)[j]
+    return seam
 
-    for i in range(1, h):
-        for j in range(w):
-            min_cost, idx = cost[i-1, j], j
-            if j > 0 and cost[i-1, j-1] < min_cost:
-                min_cost, idx = cost[i-1, j-1], j-1
-            if j < w-1 and cost[i-1, j+1] < min_cost:
-                min_cost, idx = cost[i-1, j+1], j+1
-            cost[i, j] += min_cost
-            back[i, j] = idx
-
-    seam = []
-    j = int(np.argmin(cost[-1]))
-    for i in range(h-1, -1, -1):
-        seam.append((i, j))
-        j = back[i, j]
-    return list(reversed(seam))
+def find_vertical_seam(energy):
+    return [(i, j) for i, j in enumerate(find_seam(energy).tolist())]
 
 def remove_vertical_seam(img, seam):
     return [row[:j] + row[j+1:] for row, (_, j) in zip(img, seam)]
 
 def remove_n_vertical_seams(img, n):
+    carver = SeamCarver(img)
     for i in range(n):
         print(f"[Vertical] Removing seam {i+1}/{n}")
-        if len(img[0]) <= 1:
+        if carver.width <= 1:
             print("Image too narrow for more vertical seams.")
             break
-        energy = compute_energy(img)
-        seam = find_vertical_seam(energy)
-        img = remove_vertical_seam(img, seam)
-    return img
+        carver.remove_seam(vertical=True)
+    return carver.image()
 
 # ---------- Horizontal Seam Functions ----------
-def transpose(img):
-    return [list(col) for col in zip(*img)]
-
 def remove_n_horizontal_seams(img, n):
-    img_t = transpose(img)
+    carver = SeamCarver(img)
     for i in range(n):
         print(f"[Horizontal] Removing seam {i+1}/{n}")
-        if len(img_t[0]) <= 1:
+        if carver.height <= 1:
             print("Image too short for more horizontal seams.")
             break
-        energy = compute_energy(img_t)
-        seam = find_vertical_seam(energy)
-        img_t = remove_vertical_seam(img_t, seam)
-    return transpose(img_t)
+        carver.remove_seam(vertical=False)
+    return carver.image()
+
+# ---------- Carving Engine ----------
+# energy of the given pixels only, with the same edge handling as
+# compute_energy (a missing neighbor counts as the pixel itself)
+def energy_at(arr, rows, cols):
+    h, w = arr.shape
+    center = arr[rows, cols]
+    up    = arr[np.maximum(rows - 1, 0), cols]
+    down  = arr[np.minimum(rows + 1, h - 1), cols]
+    left  = arr[rows, np.maximum(cols - 1, 0)]
+    right = arr[rows, np.minimum(cols + 1, w - 1)]
+    return np.abs(center - up) + np.abs(center - down) + np.abs(center - left) + np.abs(center - right)
+
+# pixels and energy kept as NumPy arrays for a whole carving run.
+# a seam is removed with a mask (vertical) or a gather of the kept rows
+# (horizontal), and energy is then recomputed only in a band of four
+# pixels per line around it: with seams moving at most one pixel per
+# line, no other pixel has a different neighbor afterwards. the
+# cumulative cost table is rebuilt for each seam, since a removed pixel
+# changes the cost of everything below it.
+class SeamCarver:
+    def __init__(self, img):
+        self.pixels = np.array(img, dtype=int)
+        self.energy = compute_energy(self.pixels)
+
+    @property
+    def height(self):
+        return self.pixels.shape[0]
+
+    @property
+    def width(self):
+        return self.pixels.shape[1]
+
+    def find_seam(self, vertical=True):
+        return find_seam(self.energy, vertical)
+
+    def remove_seam(self, seam=None, vertical=True):
+        if seam is None:
+            seam = self.find_seam(vertical)
+        h, w = self.pixels.shape
+
+        if vertical:
+            mask = np.ones((h, w), dtype=bool)
+            mask[np.arange(h), seam] = False
+            self.pixels = self.pixels[mask].reshape(h, w - 1)
+            self.energy = self.energy[mask].reshape(h, w - 1)
+            rows = np.repeat(np.arange(h), 4)
+            cols = np.clip((seam[:, None] + np.arange(-2, 2)).ravel(), 0, w - 2)
+        else:
+            kept = np.arange(h - 1)[:, None]
+            kept = kept + (kept >= seam[None, :])
+            self.pixels = np.take_along_axis(self.pixels, kept, axis=0)
+            self.energy = np.take_along_axis(self.energy, kept, axis=0)
+            rows = np.clip((seam[:, None] + np.arange(-2, 2)).ravel(), 0, h - 2)
+            cols = np.repeat(np.arange(w), 4)
+
+        self.energy[rows, cols] = energy_at(self.pixels, rows, cols)
+        return seam
+
+    def image(self):
+        return self.pixels.tolist()
 
 # ---------- Main ----------
 def main():